@@ -1,14 +1,56 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import Flask, Request, Response, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, User, Department, Equipment, Personnel, Area, Assignment
-from sqlalchemy import or_
-from forms import LoginForm, RegisterForm, DepartmentForm, EquipmentForm, PersonnelForm, AreaForm, AssignmentForm
+from models import db, User, Department, Equipment, Personnel, Area, Assignment, ACTIVE_ASSIGNMENT_INDEX
+from sqlalchemy import or_, func, literal, null, union_all, text
+from sqlalchemy.orm import joinedload, contains_eager
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from forms import LoginForm, RegisterForm, DepartmentForm, EquipmentForm, PersonnelForm, AreaForm, AssignmentForm, EquipmentImportForm
 from config import Config
-from datetime import datetime
+from pagination import paginate_keyset
+from search import setup_search, match_clause, search_equipment, search_personnel
+import bulk
+import cache
+import concurrency
+import conditional
+from conditional import conditional_list
+import fragments
+import images
+import metrics
+import uploads
+import user_cache
+import password_hashing
+from password_hashing import HashingBusy
+from lookups import department_choices, area_choices, equipment_types
+from importer import import_equipment
+from exporter import export_query, iter_csv, write_xlsx, iter_file
+from db_pool import pool_status
+from datetime import datetime, timedelta
 import os
+import uuid
+import hmac
+from flask.sessions import SecureCookieSessionInterface
+import click
 from werkzeug.utils import secure_filename
 
+class InventarioRequest(Request):
+    # La importación masiva admite archivos más grandes que el resto de formularios
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'import_equipment_view':
+            return app.config['IMPORT_MAX_CONTENT_LENGTH']
+        return app.config['MAX_CONTENT_LENGTH']
+
+class InventarioSessionInterface(SecureCookieSessionInterface):
+    # Las fotos con URL firmada no usan la sesión: no se decodifica la cookie
+    def open_session(self, app, request):
+        if request.path.startswith('/uploads/') and 'sig' in request.args:
+            return self.make_null_session(app)
+        return super().open_session(app, request)
+
 app = Flask(__name__)
+app.request_class = InventarioRequest
+app.session_interface = InventarioSessionInterface()
 app.config.from_object(Config)
 
 # Crear directorio de uploads si no existe
@@ -17,7 +59,22 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+@app.template_global()
+def url_with_args(**updates):
+    # URL de la vista actual conservando los filtros, sin los cursores de página
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update({key: value for key, value in updates.items() if value is not None})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
 db.init_app(app)
+cache.init_app(app)
+fragments.init_app(app)
+images.init_app(app)
+metrics.init_app(app)
+user_cache.init_app(app)
+password_hashing.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -25,26 +82,60 @@ login_manager.login_message = 'Por favor inicia sesión para acceder a esta pág
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Copia cacheada por proceso (ver user_cache.py), no la fila completa en cada petición
+    return user_cache.load_user(user_id)
+
+# Llave del advisory lock de PostgreSQL que serializa init-db entre instancias
+INIT_DB_LOCK_KEY = 72410001
 
-def create_tables():
+def init_database():
+    """
+    Crea tablas, columnas e índices nuevos, índice de búsqueda y usuario admin (idempotente).
+
+    Se ejecuta con `flask init-db` antes de arrancar gunicorn, no al importar
+    la aplicación: los workers arrancan sin tocar la base de datos. En
+    PostgreSQL un advisory lock evita que dos instancias lo hagan a la vez.
+    """
+    from migrate_columns import add_missing_columns, backfill_not_null
+    from migrate_indexes import create_indexes
     with app.app_context():
-        try:
-            # Crear todas las tablas si no existen (no eliminar en producción)
-            db.create_all()
-            # Crear usuario admin por defecto si no existe
-            if not User.query.filter_by(username='admin').first():
-                admin = User(username='admin', email='admin@example.com')
-                admin.set_password('admin123')
-                db.session.add(admin)
-                db.session.commit()
+        is_postgres = db.engine.dialect.name == 'postgresql'
+        # Lock de sesión en AUTOCOMMIT: una transacción abierta bloquearía CREATE INDEX CONCURRENTLY
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as lock_conn:
+            if is_postgres:
+                lock_conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': INIT_DB_LOCK_KEY})
+            try:
+                # Crear todas las tablas si no existen (no eliminar en producción)
+                db.create_all()
+                # Columnas nuevas de models.py en tablas ya existentes
+                add_missing_columns(db.engine)
+                # Filas antiguas con NULL en columnas que ahora son NOT NULL
+                backfill_not_null(db.engine)
+                # Índices declarados en models.py que falten en tablas ya existentes
+                create_indexes(db.engine)
+                # Contadores que validan los ETag de los listados
+                conditional.ensure_versions()
+                # Índice de búsqueda de equipos (trigramas en PostgreSQL, FTS5 en SQLite)
+                try:
+                    setup_search()
+                except Exception as e:
+                    print(f"No se pudo crear el índice de búsqueda: {e}")
+                # Crear usuario admin por defecto si no existe
+                if not User.query.filter_by(username='admin').first():
+                    admin = User(username='admin', email='admin@example.com')
+                    admin.set_password(os.environ.get('ADMIN_PASSWORD') or 'admin123')
+                    db.session.add(admin)
+                    db.session.commit()
+                    print("Usuario admin creado")
                 print("Base de datos inicializada correctamente")
-        except Exception as e:
-            print(f"Error al crear tablas: {e}")
-            db.session.rollback()
+            finally:
+                if is_postgres:
+                    lock_conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': INIT_DB_LOCK_KEY})
 
-# Crear tablas al iniciar
-create_tables()
+@app.cli.command('init-db')
+def init_db_command():
+    """Crea el esquema y el usuario admin (ejecutar antes de iniciar gunicorn)."""
+    init_database()
 
 @app.route('/')
 def index():
@@ -60,13 +151,29 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except HashingBusy:
+            return hashing_busy_response('login.html', form)
+        if valid:
+            if password_hashing.needs_rehash(user.password_hash):
+                # Cambiaron los parámetros del hash: se actualiza con la contraseña ya verificada
+                try:
+                    user.set_password(form.password.data)
+                    db.session.commit()
+                except HashingBusy:
+                    pass
             login_user(user)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('dashboard'))
         flash('Usuario o contraseña incorrectos', 'danger')
     return render_template('login.html', form=form)
 
+def hashing_busy_response(template, form):
+    # Ráfaga de inicios de sesión: se responde de inmediato en lugar de ocupar el worker
+    flash('Hay muchas solicitudes de inicio de sesión en este momento. Intente de nuevo en unos segundos.', 'warning')
+    return render_template(template, form=form), 503, {'Retry-After': '5'}
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -82,7 +189,10 @@ def register():
             return render_template('register.html', form=form)
         
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusy:
+            return hashing_busy_response('register.html', form)
         db.session.add(user)
         db.session.commit()
         flash('Registro exitoso. Por favor inicia sesión.', 'success')
@@ -92,29 +202,58 @@ def register():
 @app.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
     flash('Sesión cerrada exitosamente', 'info')
     return redirect(url_for('login'))
 
+def dashboard_stats():
+    """Totales y desgloses del dashboard calculados en una sola consulta."""
+    text_null = null().cast(db.String)
+    # Una sola pasada por equipment agrupada por estatus, tipo y departamento;
+    # los totales de las otras tablas se agregan con UNION ALL
+    equipment_groups = (db.select(literal('equipment').label('kind'),
+                                  Equipment.status.label('status'),
+                                  Equipment.equipment_type.label('equipment_type'),
+                                  Department.name.label('department'),
+                                  func.count().label('total'))
+                        .join(Department, Department.id == Equipment.department_id)
+                        .group_by(Equipment.status, Equipment.equipment_type, Department.name))
+    totals = [db.select(literal(model.__tablename__).label('kind'), text_null, text_null, text_null,
+                        func.count().label('total')).select_from(model)
+              for model in (Department, Area, Personnel)]
+    rows = db.session.execute(union_all(equipment_groups, *totals)).all()
+
+    stats = {'total_departments': 0, 'total_areas': 0, 'total_personnel': 0, 'total_equipment': 0,
+             'by_status': {}, 'by_type': {}, 'by_department': {}}
+    for kind, status, equipment_type, department, total in rows:
+        if kind == 'equipment':
+            stats['total_equipment'] += total
+            stats['by_status'][status] = stats['by_status'].get(status, 0) + total
+            stats['by_type'][equipment_type] = stats['by_type'].get(equipment_type, 0) + total
+            stats['by_department'][department] = stats['by_department'].get(department, 0) + total
+        elif kind == 'department':
+            stats['total_departments'] = total
+        elif kind == 'area':
+            stats['total_areas'] = total
+        elif kind == 'personnel':
+            stats['total_personnel'] = total
+    stats['available_equipment'] = stats['by_status'].get('Disponible', 0)
+    for breakdown in ('by_status', 'by_type', 'by_department'):
+        stats[breakdown] = sorted(stats[breakdown].items(), key=lambda item: (-item[1], item[0]))
+    return stats
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    total_departments = Department.query.count()
-    total_areas = Area.query.count()
-    total_equipment = Equipment.query.count()
-    total_personnel = Personnel.query.count()
-    available_equipment = Equipment.query.filter_by(status='Disponible').count()
-    
-    return render_template('dashboard.html', 
-                         total_departments=total_departments,
-                         total_areas=total_areas,
-                         total_equipment=total_equipment,
-                         total_personnel=total_personnel,
-                         available_equipment=available_equipment)
+    stats = cache.memoize('dashboard_stats', ['department', 'area', 'personnel', 'equipment'],
+                          dashboard_stats, ttl=app.config['DASHBOARD_CACHE_TTL'])
+    return render_template('dashboard.html', **stats)
 
 # Rutas para Departamentos
 @app.route('/departments')
 @login_required
+@conditional_list('department')
 def departments():
     departments_list = Department.query.order_by(Department.name).all()
     return render_template('departments.html', departments=departments_list)
@@ -162,65 +301,81 @@ def delete_department(id):
     return redirect(url_for('departments'))
 
 # Rutas para Equipos
-@app.route('/equipment')
-@login_required
-def equipment():
-    # Get filter parameters
-    search = request.args.get('search')
-    type_filter = request.args.get('type')
-    department_filter = request.args.get('department')
-    area_filter = request.args.get('area')
-    status_filter = request.args.get('status')
-    date_filter = request.args.get('date')
-
-    query = Equipment.query
+def equipment_filters(args):
+    """Condiciones WHERE de los filtros del listado de equipos (también las usa la exportación)."""
+    search = args.get('search')
+    type_filter = args.get('type')
+    department_filter = args.get('department')
+    area_filter = args.get('area')
+    status_filter = args.get('status')
+    date_filter = args.get('date')
+    conditions = []
 
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(or_(
-            Equipment.code.ilike(search_term),
-            Equipment.serial.ilike(search_term),
-            Equipment.brand.ilike(search_term),
-            Equipment.model.ilike(search_term)
-        ))
+        search_filter = match_clause(search)
+        if search_filter is not None:
+            conditions.append(search_filter)
     
     if type_filter:
-        query = query.filter(Equipment.equipment_type == type_filter)
+        conditions.append(Equipment.equipment_type == type_filter)
     
     if department_filter:
-        query = query.filter(Equipment.department_id == department_filter)
+        conditions.append(Equipment.department_id == department_filter)
         
     if area_filter:
-        query = query.filter(Equipment.area_id == area_filter)
+        conditions.append(Equipment.area_id == area_filter)
         
     if status_filter:
-        query = query.filter(Equipment.status == status_filter)
+        conditions.append(Equipment.status == status_filter)
         
     if date_filter:
         try:
-            date_obj = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            query = query.filter(db.func.date(Equipment.registration_date) == date_obj)
+            # Rango [día, día siguiente) en lugar de date(registration_date) para poder usar el índice
+            day_start = datetime.strptime(date_filter, '%Y-%m-%d')
+            conditions.append(Equipment.registration_date >= day_start)
+            conditions.append(Equipment.registration_date < day_start + timedelta(days=1))
         except ValueError:
             pass
+    return conditions
+
+@app.route('/equipment')
+@login_required
+@conditional_list('equipment', 'department', 'area', 'personnel', signed_images=True)
+def equipment():
+    # Departamento, biblioteca y personal asignado en la misma consulta
+    query = Equipment.query.options(
+        joinedload(Equipment.department),
+        joinedload(Equipment.area),
+        joinedload(Equipment.assigned_personnel)
+    ).filter(*equipment_filters(request.args))
 
-    equipment_list = query.order_by(Equipment.created_at.desc()).all()
+    page = paginate_keyset(query, [Equipment.created_at, Equipment.id],
+                           app.config['ITEMS_PER_PAGE'],
+                           after=request.args.get('after'),
+                           before=request.args.get('before'))
     
     # Get data for filters
-    types = [t[0] for t in db.session.query(Equipment.equipment_type).distinct()]
-    departments = Department.query.order_by(Department.name).all()
-    areas = Area.query.order_by(Area.name).all()
+    types = equipment_types()
+    departments = department_choices()
+    areas = area_choices()
+
+    # La exportación aplica los filtros actuales, sin los cursores de página
+    export_args = {key: value for key, value in request.args.items() if key not in ('after', 'before')}
 
     return render_template('equipment.html', 
-                         equipment=equipment_list,
+                         equipment=page.items,
+                         page=page,
+                         export_args=export_args,
                          types=types,
                          departments=departments,
-                         areas=areas)
+                         areas=areas,
+                         bulk_statuses=bulk.BULK_STATUSES)
 
 @app.route('/equipment/add', methods=['GET', 'POST'])
 @login_required
 def add_equipment():
     # Verificar que existan departamentos
-    if Department.query.count() == 0:
+    if not department_choices():
         flash('Debe crear al menos un departamento antes de agregar equipos', 'warning')
         return redirect(url_for('add_department'))
     
@@ -239,10 +394,8 @@ def add_equipment():
             if form.image.data:
                 file = form.image.data
                 if file and allowed_file(file.filename):
-                    filename = secure_filename(f"{form.code.data}_{file.filename}")
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-                    image_filename = filename
+                    image_filename = uploads.store_upload(file, app.config['UPLOAD_FOLDER'])
+                    images.submit_variants(app.config['UPLOAD_FOLDER'], image_filename)
             
             equipment = Equipment(
                 code=form.code.data,
@@ -279,26 +432,106 @@ def add_equipment():
                 flash(f'Error en {getattr(form, field).label.text}: {error}', 'danger')
     return render_template('equipment_form.html', form=form, title='Agregar Equipo')
 
+def run_equipment_import(fileobj, filename):
+    # Devuelve el resultado y el nombre del reporte de errores (None si no hubo errores)
+    folder = app.config['IMPORT_REPORT_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    report_name = f"importacion_{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}.csv"
+    report_path = os.path.join(folder, report_name)
+    with open(report_path, 'w', newline='', encoding='utf-8') as report_file:
+        result = import_equipment(fileobj, filename, report_file, batch_size=app.config['IMPORT_BATCH_SIZE'])
+    if not result.errors:
+        os.remove(report_path)
+        report_name = None
+    return result, report_name
+
+@app.route('/equipment/export')
+@login_required
+def export_equipment():
+    # Mismos filtros que el listado; las filas se envían a medida que se leen
+    query = export_query(equipment_filters(request.args))
+    filename = f"equipos_{datetime.now():%Y%m%d_%H%M}"
+    if request.args.get('format') == 'xlsx':
+        body = iter_file(write_xlsx(query))
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        filename += '.xlsx'
+    else:
+        body = iter_csv(query)
+        mimetype = 'text/csv; charset=utf-8'
+        filename += '.csv'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/equipment/import', methods=['GET', 'POST'])
+@login_required
+def import_equipment_view():
+    form = EquipmentImportForm()
+    result = report_name = None
+    if form.validate_on_submit():
+        file = form.file.data
+        try:
+            # Werkzeug guarda los archivos grandes en disco: se leen como stream
+            result, report_name = run_equipment_import(file.stream, file.filename)
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error al importar equipos: {str(e)}', 'danger')
+        else:
+            flash(f'{result.inserted} de {result.total} equipos importados', 'success' if not result.errors else 'warning')
+    elif request.method == 'POST':
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(f'Error en {getattr(form, field).label.text}: {error}', 'danger')
+    return render_template('equipment_import.html', form=form, result=result, report_name=report_name)
+
+@app.route('/equipment/import/report/<filename>')
+@login_required
+def equipment_import_report(filename):
+    return send_from_directory(os.path.abspath(app.config['IMPORT_REPORT_FOLDER']), filename, as_attachment=True)
+
+@app.cli.command('import-equipment')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_equipment_command(path):
+    """Importa equipos desde un archivo CSV o XLSX (sin límite de tiempo de gunicorn)."""
+    with open(path, 'rb') as fileobj:
+        result, report_name = run_equipment_import(fileobj, path)
+    click.echo(f"✓ {result.inserted} de {result.total} equipos importados")
+    if report_name:
+        click.echo(f"✗ {result.errors} filas con errores: "
+                   f"{os.path.join(app.config['IMPORT_REPORT_FOLDER'], report_name)}")
+
 @app.route('/equipment/view/<int:id>')
 @login_required
 def view_equipment(id):
     equipment = Equipment.query.get_or_404(id)
     return render_template('equipment_view.html', equipment=equipment)
 
+def edit_conflict(template, form_class, form, current, **context):
+    # El registro cambió desde que se abrió el formulario: no se guarda nada y se
+    # muestran las diferencias con la versión actual (ver concurrency.py)
+    conflict = concurrency.resolve(form, current, form_class(formdata=None, obj=current))
+    flash('Otro usuario modificó este registro mientras lo editabas. Revisa las diferencias '
+          'y guarda de nuevo para sobrescribirlas.', 'warning')
+    return render_template(template, form=form, conflict=conflict, **context), 409
+
 @app.route('/equipment/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_equipment(id):
     equipment = Equipment.query.get_or_404(id)
     form = EquipmentForm(obj=equipment)
-    form.registration_date.data = equipment.registration_date.date() if equipment.registration_date else None
-    form.assignment_date.data = equipment.assignment_date.date() if equipment.assignment_date else None
-    form.purchase_date.data = equipment.purchase_date.date() if equipment.purchase_date else None
-    form.warranty_expiry.data = equipment.warranty_expiry.date() if equipment.warranty_expiry else None
-    # Inicializar área si existe
-    if equipment.area_id:
-        form.area_id.data = equipment.area_id
+    # Solo al abrir el formulario: en el POST se conserva lo que envió el usuario
+    if request.method == 'GET':
+        form.registration_date.data = equipment.registration_date.date() if equipment.registration_date else None
+        form.assignment_date.data = equipment.assignment_date.date() if equipment.assignment_date else None
+        form.purchase_date.data = equipment.purchase_date.date() if equipment.purchase_date else None
+        form.warranty_expiry.data = equipment.warranty_expiry.date() if equipment.warranty_expiry else None
+        # Inicializar área si existe
+        if equipment.area_id:
+            form.area_id.data = equipment.area_id
     
     if form.validate_on_submit():
+        if concurrency.is_stale(form, equipment):
+            return edit_conflict('equipment_form.html', EquipmentForm, form, equipment,
+                                 title='Editar Equipo', equipment=equipment)
         if Equipment.query.filter(Equipment.code == form.code.data, Equipment.id != id).first():
             flash('El código ya existe', 'danger')
             return render_template('equipment_form.html', form=form, title='Editar Equipo', equipment=equipment)
@@ -307,19 +540,13 @@ def edit_equipment(id):
             return render_template('equipment_form.html', form=form, title='Editar Equipo', equipment=equipment)
         
         # Manejar imagen si se sube una nueva
+        old_image = new_image = None
         if form.image.data:
             file = form.image.data
             if file and allowed_file(file.filename):
-                # Eliminar imagen anterior si existe
-                if equipment.image_filename:
-                    old_filepath = os.path.join(app.config['UPLOAD_FOLDER'], equipment.image_filename)
-                    if os.path.exists(old_filepath):
-                        os.remove(old_filepath)
-                # Guardar nueva imagen
-                filename = secure_filename(f"{form.code.data}_{file.filename}")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                equipment.image_filename = filename
+                old_image = equipment.image_filename
+                new_image = equipment.image_filename = uploads.store_upload(file, app.config['UPLOAD_FOLDER'])
+                images.submit_variants(app.config['UPLOAD_FOLDER'], equipment.image_filename)
         
         equipment.code = form.code.data
         equipment.serial = form.serial.data
@@ -340,7 +567,23 @@ def edit_equipment(id):
         equipment.notes = form.notes.data
         equipment.updated_at = datetime.utcnow()
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # Otra petición guardó el equipo entre la lectura y el commit
+            db.session.rollback()
+            # La foto recién subida no quedó en ningún equipo
+            if new_image:
+                uploads.release_upload(app.config['UPLOAD_FOLDER'], new_image)
+            current = db.session.get(Equipment, id)
+            if current is None:
+                flash('El equipo fue eliminado mientras lo editabas', 'warning')
+                return redirect(url_for('equipment'))
+            return edit_conflict('equipment_form.html', EquipmentForm, form, current,
+                                 title='Editar Equipo', equipment=current)
+        # La imagen anterior se borra solo si ningún otro equipo la usa
+        if old_image and old_image != equipment.image_filename:
+            uploads.release_upload(app.config['UPLOAD_FOLDER'], old_image)
         flash('Equipo actualizado exitosamente', 'success')
         return redirect(url_for('equipment'))
     return render_template('equipment_form.html', form=form, title='Editar Equipo', equipment=equipment)
@@ -349,24 +592,164 @@ def edit_equipment(id):
 @login_required
 def delete_equipment(id):
     equipment = Equipment.query.get_or_404(id)
-    # Eliminar imagen si existe
-    if equipment.image_filename:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], equipment.image_filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
+    image_filename = equipment.image_filename
     db.session.delete(equipment)
     db.session.commit()
+    # Eliminar la imagen si ningún otro equipo la usa
+    uploads.release_upload(app.config['UPLOAD_FOLDER'], image_filename)
     flash('Equipo eliminado exitosamente', 'success')
     return redirect(url_for('equipment'))
 
-@app.route('/uploads/<filename>')
+# Filtros del listado que el formulario de acciones masivas reenvía
+EQUIPMENT_FILTER_ARGS = ('search', 'type', 'department', 'area', 'status', 'date')
+
+def bulk_summary(result):
+    return f'{result.equipment} equipos actualizados, {result.assignments} asignaciones devueltas'
+
+@app.route('/equipment/bulk', methods=['POST'])
 @login_required
+def bulk_equipment():
+    filters = {key: request.form.get(f'filter_{key}') for key in EQUIPMENT_FILTER_ARGS
+               if request.form.get(f'filter_{key}')}
+    back = redirect(url_for('equipment', **filters))
+    if request.form.get('scope') == 'filtered':
+        # Todos los equipos que cumplen los filtros del listado, no solo la página actual
+        conditions = equipment_filters(filters)
+    else:
+        ids = request.form.getlist('ids', type=int)
+        if not ids:
+            flash('Selecciona al menos un equipo', 'warning')
+            return back
+        conditions = [Equipment.id.in_(ids)]
+
+    action = request.form.get('action')
+    try:
+        if action == 'status':
+            status = request.form.get('status')
+            if status not in bulk.BULK_STATUSES:
+                flash('Selecciona un estatus válido', 'warning')
+                return back
+            result = bulk.set_equipment_status(conditions, status)
+        elif action == 'return':
+            result = bulk.return_assignments([Assignment.equipment_id.in_(
+                db.select(Equipment.id).where(*conditions))])
+        elif action == 'move':
+            area_id = request.form.get('area_id', type=int)
+            if area_id is not None and db.session.get(Area, area_id) is None:
+                flash('La biblioteca seleccionada no existe', 'warning')
+                return back
+            result = bulk.move_equipment(conditions, area_id)
+        else:
+            flash('Acción no válida', 'warning')
+            return back
+        flash(bulk_summary(result), 'success')
+    except Exception as e:
+        flash(f'Error en la operación masiva: {str(e)}', 'danger')
+    return back
+
+def image_access_denied(filename, variant=None):
+    # Con firma se verifica sin base de datos; sin firma se exige sesión iniciada
+    if 'sig' in request.args:
+        if uploads.verify_signature(filename, variant, request.args.get('exp'), request.args.get('sig')):
+            return None
+        return 'Enlace inválido o expirado', 403
+    if not current_user.is_authenticated:
+        return login_manager.unauthorized()
+    return None
+
+@app.template_global()
+def image_url(filename, variant=None):
+    return uploads.signed_url(filename, variant)
+
+@app.template_global()
+def cached_row(kind, obj):
+    # Fila de equipos o asignaciones renderizada una vez y reutilizada (ver fragments.py)
+    return fragments.render_row(kind, obj)
+
+@app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    denied = image_access_denied(filename)
+    if denied is not None:
+        return denied
+    return uploads.send_upload(app.config['UPLOAD_FOLDER'], filename)
+
+# Miniatura (thumb) o vista previa (preview) de una foto; se genera si aún no existe
+@app.route('/uploads/<variant>/<filename>')
+def image_variant(variant, filename):
+    denied = image_access_denied(filename, variant)
+    if denied is not None:
+        return denied
+    if variant not in images.VARIANTS:
+        return 'Variante no encontrada', 404
+    upload_folder = app.config['UPLOAD_FOLDER']
+    path = images.variant_path(upload_folder, variant, secure_filename(filename))
+    if not os.path.exists(path):
+        try:
+            images.generate_variants(upload_folder, secure_filename(filename), [variant])
+        except Exception as e:
+            app.logger.warning(f'No se pudo generar {variant} de {filename}: {e}')
+    if not os.path.exists(path):
+        return 'Imagen no encontrada', 404
+    return uploads.send_upload(upload_folder, filename, variant_path=path, variant=variant)
+
+@app.cli.command('uploads-migrate')
+def uploads_migrate_command():
+    """Renombra las fotos antiguas a nombres por contenido (deduplicando)."""
+    updated, removed = uploads.migrate_legacy_uploads(app.config['UPLOAD_FOLDER'])
+    click.echo(f"✓ {updated} equipos actualizados, {removed} archivos duplicados o antiguos borrados")
+
+@app.cli.command('uploads-gc')
+def uploads_gc_command():
+    """Borra las fotos que ningún equipo referencia."""
+    removed = uploads.collect_garbage(app.config['UPLOAD_FOLDER'])
+    click.echo(f"✓ {removed} archivos sin referencias borrados")
+
+@app.cli.command('images-backfill')
+def images_backfill_command():
+    """Genera las miniaturas que falten de las fotos de equipos existentes."""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    created = failed = 0
+    for (filename,) in db.session.query(Equipment.image_filename).filter(Equipment.image_filename.isnot(None)):
+        try:
+            if images.generate_variants(upload_folder, filename):
+                created += 1
+        except Exception as e:
+            failed += 1
+            click.echo(f"✗ {filename}: {e}")
+    click.echo(f"✓ Miniaturas generadas para {created} fotos" + (f", {failed} con errores" if failed else ''))
+
+@app.cli.command('seed')
+@click.option('--seed', 'random_seed', default=42, show_default=True, help='Semilla: los mismos datos en cada ejecución')
+@click.option('--departments', default=300, show_default=True)
+@click.option('--areas', default=200, show_default=True)
+@click.option('--personnel', default=50000, show_default=True)
+@click.option('--equipment', default=1000000, show_default=True)
+@click.option('--assignments-per-equipment', default=3.0, show_default=True, help='Promedio del historial por equipo')
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--truncate', is_flag=True, help='Vaciar primero las tablas del inventario')
+@click.option('--yes', is_flag=True, help='No pedir confirmación para --truncate')
+def seed_command(random_seed, departments, areas, personnel, equipment, assignments_per_equipment,
+                 batch_size, truncate, yes):
+    """Genera un inventario sintético grande para pruebas de escala (PostgreSQL o SQLite)."""
+    import seeder
+    existing = seeder.existing_rows()
+    if existing and not truncate:
+        raise click.ClickException(f"Las tablas {', '.join(existing)} ya tienen datos; usa --truncate para vaciarlas")
+    if truncate:
+        if not yes:
+            click.confirm(f'Se borrarán todos los datos del inventario en {db.engine.url.render_as_string()}. ¿Continuar?',
+                          abort=True)
+        seeder.truncate()
+    started = datetime.now()
+    inserted = seeder.seed_inventory(random_seed, departments, areas, personnel, equipment,
+                                     assignments_per_equipment, batch_size, progress=click.echo)
+    click.echo(f"✓ {inserted['equipment']} equipos y {inserted['assignment']} asignaciones "
+               f"en {(datetime.now() - started).total_seconds():.0f}s")
 
 # Rutas para Áreas
 @app.route('/areas')
 @login_required
+@conditional_list('area')
 def areas():
     areas_list = Area.query.order_by(Area.name).all()
     return render_template('areas.html', areas=areas_list)
@@ -417,8 +800,13 @@ def delete_area(id):
 # Rutas para Personal
 @app.route('/personnel')
 @login_required
+@conditional_list('personnel', 'department', 'area')
 def personnel():
-    personnel_list = Personnel.query.order_by(Personnel.name).all()
+    # Departamento y biblioteca de cada persona en la misma consulta (la plantilla muestra ambos)
+    personnel_list = Personnel.query.options(
+        joinedload(Personnel.department),
+        joinedload(Personnel.area)
+    ).order_by(Personnel.name).all()
     return render_template('personnel.html', personnel=personnel_list)
 
 @app.route('/personnel/add', methods=['GET', 'POST'])
@@ -482,12 +870,91 @@ def delete_personnel(id):
     flash('Personal eliminado exitosamente', 'success')
     return redirect(url_for('personnel'))
 
+@app.route('/personnel/<int:id>/return-all', methods=['POST'])
+@login_required
+def return_personnel_equipment(id):
+    personnel = Personnel.query.get_or_404(id)
+    try:
+        result = bulk.return_assignments([Assignment.personnel_id == personnel.id])
+        flash(f'{personnel.name} {personnel.last_name}: {bulk_summary(result)}', 'success')
+    except Exception as e:
+        flash(f'Error al devolver equipos: {str(e)}', 'danger')
+    return redirect(url_for('personnel'))
+
 # Rutas para Asignaciones
+def assignments_query():
+    # Equipo, personal y departamento del personal en una sola consulta
+    return (Assignment.query
+            .join(Assignment.equipment)
+            .join(Assignment.personnel)
+            .options(contains_eager(Assignment.equipment),
+                     contains_eager(Assignment.personnel).joinedload(Personnel.department)))
+
+def paginate_assignments(query):
+    return paginate_keyset(query, [Assignment.assignment_date, Assignment.id],
+                           app.config['ITEMS_PER_PAGE'],
+                           after=request.args.get('after'),
+                           before=request.args.get('before'))
+
 @app.route('/assignments')
 @login_required
+@conditional_list('assignment', 'equipment', 'personnel', 'department')
 def assignments():
-    assignments_list = Assignment.query.order_by(Assignment.assignment_date.desc()).all()
-    return render_template('assignments.html', assignments=assignments_list)
+    query = assignments_query().filter(Assignment.status == 'Activa')
+    page = paginate_assignments(query)
+    return render_template('assignments.html', assignments=page.items, page=page, view='active')
+
+@app.route('/assignments/history')
+@login_required
+@conditional_list('assignment', 'equipment', 'personnel', 'department')
+def assignments_history():
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    person = request.args.get('person')
+    equipment_code = request.args.get('equipment')
+
+    query = assignments_query().filter(Assignment.status != 'Activa')
+
+    # Rango de fechas sobre la fecha de asignación (el límite superior incluye todo el día)
+    try:
+        if date_from:
+            query = query.filter(Assignment.assignment_date >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(Assignment.assignment_date < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        pass
+
+    if person:
+        person_term = f"%{person}%"
+        query = query.filter(or_(
+            Personnel.name.ilike(person_term),
+            Personnel.last_name.ilike(person_term),
+            Personnel.employee_id.ilike(person_term)
+        ))
+
+    if equipment_code:
+        query = query.filter(or_(
+            Equipment.code.ilike(f"{equipment_code}%"),
+            Equipment.serial.ilike(f"{equipment_code}%")
+        ))
+
+    if request.args.get('personnel_id', type=int):
+        query = query.filter(Assignment.personnel_id == request.args.get('personnel_id', type=int))
+    if request.args.get('equipment_id', type=int):
+        query = query.filter(Assignment.equipment_id == request.args.get('equipment_id', type=int))
+
+    page = paginate_assignments(query)
+    return render_template('assignments.html', assignments=page.items, page=page, view='history')
+
+# Aviso cuando otra petición cambió la asignación o su equipo antes del commit (ver concurrency.py)
+STALE_ASSIGNMENT_MESSAGE = ('Otro usuario modificó esta asignación o su equipo mientras tanto. '
+                            'Revisa el listado y vuelve a intentarlo.')
+
+def active_assignment_conflict(error):
+    # La inserción chocó con el índice de una asignación activa por equipo (PostgreSQL
+    # informa el nombre del índice; SQLite, la columna)
+    name = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+    return name == ACTIVE_ASSIGNMENT_INDEX or 'assignment.equipment_id' in str(error.orig)
 
 @app.route('/assignments/add', methods=['GET', 'POST'])
 @login_required
@@ -497,16 +964,6 @@ def add_assignment():
         try:
             equipment = Equipment.query.get_or_404(form.equipment_id.data)
             
-            # Verificar si el equipo ya está asignado activamente
-            active_assignment = Assignment.query.filter_by(
-                equipment_id=form.equipment_id.data,
-                status='Activa'
-            ).first()
-            
-            if active_assignment:
-                flash('Este equipo ya tiene una asignación activa', 'warning')
-                return render_template('assignment_form.html', form=form, title='Agregar Asignación')
-            
             assignment = Assignment(
                 equipment_id=form.equipment_id.data,
                 personnel_id=form.personnel_id.data,
@@ -517,16 +974,30 @@ def add_assignment():
                 assigned_by=current_user.username
             )
             
-            # Actualizar el equipo
-            equipment.assigned_to_id = form.personnel_id.data
-            equipment.assignment_date = form.assignment_date.data
+            # Actualizar el equipo solo si la asignación queda activa
             if form.status.data == 'Activa':
+                equipment.assigned_to_id = form.personnel_id.data
+                equipment.assignment_date = form.assignment_date.data
                 equipment.status = 'Asignado'
             
+            # Sin consulta previa: si el equipo ya tiene una asignación activa
+            # (o otro worker la crea a la vez) el índice único rechaza la inserción
             db.session.add(assignment)
             db.session.commit()
             flash('Asignación creada exitosamente', 'success')
             return redirect(url_for('assignments'))
+        except IntegrityError as e:
+            db.session.rollback()
+            if active_assignment_conflict(e):
+                flash('Este equipo ya tiene una asignación activa', 'warning')
+            else:
+                flash(f'Error al crear asignación: {str(e)}', 'danger')
+            return render_template('assignment_form.html', form=form, title='Agregar Asignación')
+        except StaleDataError:
+            # Otra petición asignó o modificó el equipo entre la lectura y el commit
+            db.session.rollback()
+            flash('Este equipo ya tiene una asignación activa', 'warning')
+            return render_template('assignment_form.html', form=form, title='Agregar Asignación')
         except Exception as e:
             db.session.rollback()
             flash(f'Error al crear asignación: {str(e)}', 'danger')
@@ -542,10 +1013,15 @@ def add_assignment():
 def edit_assignment(id):
     assignment = Assignment.query.get_or_404(id)
     form = AssignmentForm(obj=assignment)
-    form.assignment_date.data = assignment.assignment_date.date() if assignment.assignment_date else None
-    form.return_date.data = assignment.return_date.date() if assignment.return_date else None
+    # Solo al abrir el formulario: en el POST se conserva lo que envió el usuario
+    if request.method == 'GET':
+        form.assignment_date.data = assignment.assignment_date.date() if assignment.assignment_date else None
+        form.return_date.data = assignment.return_date.date() if assignment.return_date else None
     
     if form.validate_on_submit():
+        if concurrency.is_stale(form, assignment):
+            return edit_conflict('assignment_form.html', AssignmentForm, form, assignment,
+                                 title='Editar Asignación', assignment=assignment)
         try:
             equipment = Equipment.query.get_or_404(form.equipment_id.data)
             
@@ -572,6 +1048,22 @@ def edit_assignment(id):
             db.session.commit()
             flash('Asignación actualizada exitosamente', 'success')
             return redirect(url_for('assignments'))
+        except StaleDataError:
+            # Otra petición guardó la asignación o su equipo entre la lectura y el commit
+            db.session.rollback()
+            current = db.session.get(Assignment, id)
+            if current is None:
+                flash('La asignación fue eliminada mientras la editabas', 'warning')
+                return redirect(url_for('assignments'))
+            return edit_conflict('assignment_form.html', AssignmentForm, form, current,
+                                 title='Editar Asignación', assignment=current)
+        except IntegrityError as e:
+            db.session.rollback()
+            if active_assignment_conflict(e):
+                flash('Este equipo ya tiene una asignación activa', 'warning')
+            else:
+                flash(f'Error al actualizar asignación: {str(e)}', 'danger')
+            return render_template('assignment_form.html', form=form, title='Editar Asignación', assignment=assignment)
         except Exception as e:
             db.session.rollback()
             flash(f'Error al actualizar asignación: {str(e)}', 'danger')
@@ -599,12 +1091,30 @@ def return_assignment(id):
         
         db.session.commit()
         flash('Equipo devuelto exitosamente', 'success')
+    except StaleDataError:
+        # Otra petición modificó la asignación o su equipo entre la lectura y el commit
+        db.session.rollback()
+        flash(STALE_ASSIGNMENT_MESSAGE, 'warning')
     except Exception as e:
         db.session.rollback()
         flash(f'Error al devolver equipo: {str(e)}', 'danger')
     
     return redirect(url_for('assignments'))
 
+@app.route('/assignments/bulk-return', methods=['POST'])
+@login_required
+def bulk_return_assignments():
+    ids = request.form.getlist('ids', type=int)
+    if not ids:
+        flash('Selecciona al menos una asignación', 'warning')
+        return redirect(url_for('assignments'))
+    try:
+        result = bulk.return_assignments([Assignment.id.in_(ids)])
+        flash(bulk_summary(result), 'success')
+    except Exception as e:
+        flash(f'Error al devolver equipos: {str(e)}', 'danger')
+    return redirect(url_for('assignments'))
+
 @app.route('/assignments/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_assignment(id):
@@ -620,23 +1130,109 @@ def delete_assignment(id):
         db.session.delete(assignment)
         db.session.commit()
         flash('Asignación eliminada exitosamente', 'success')
+    except StaleDataError:
+        db.session.rollback()
+        flash(STALE_ASSIGNMENT_MESSAGE, 'warning')
     except Exception as e:
         db.session.rollback()
         flash(f'Error al eliminar asignación: {str(e)}', 'danger')
     
     return redirect(url_for('assignments'))
 
+def api_page_args():
+    # Página y tamaño de página de las APIs de búsqueda (máximo 50 resultados)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 50)
+    return page, per_page
+
+# API de búsqueda de equipos ordenada por relevancia (también usada por los selectores remotos)
+@app.route('/api/equipment/search')
+@login_required
+def api_search_equipment():
+    term = request.args.get('q', '').strip()
+    page, per_page = api_page_args()
+    # assignable=1 limita a los equipos que se pueden asignar
+    statuses = ['Disponible', 'Asignado'] if request.args.get('assignable') else None
+    rows = search_equipment(term, limit=per_page + 1, offset=(page - 1) * per_page,
+                            statuses=statuses) if term else []
+    return jsonify({
+        'query': term,
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page,
+        'results': [{
+            'id': row.id,
+            'text': f'{row.code} - {row.equipment_type} ({row.brand or ""} {row.model or ""})',
+            'code': row.code,
+            'serial': row.serial,
+            'equipment_type': row.equipment_type,
+            'brand': row.brand or '',
+            'model': row.model or '',
+            'status': row.status,
+            'ip_address': row.ip_address or '',
+            'department': row.department,
+            'score': round(float(row.score or 0), 4)
+        } for row in rows[:per_page]]
+    })
+
+# API de búsqueda de personal por prefijo de nombre, apellido o ID de empleado
+@app.route('/api/personnel/search')
+@login_required
+def api_search_personnel():
+    term = request.args.get('q', '').strip()
+    page, per_page = api_page_args()
+    rows = search_personnel(term, limit=per_page + 1, offset=(page - 1) * per_page) if term else []
+    return jsonify({
+        'query': term,
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page,
+        'results': [{
+            'id': row.id,
+            'text': f'{row.name} {row.last_name} - {row.department}',
+            'name': row.name,
+            'last_name': row.last_name,
+            'employee_id': row.employee_id or '',
+            'department': row.department
+        } for row in rows[:per_page]]
+    })
+
 # API para obtener la IP de un equipo
 @app.route('/api/equipment/<int:id>/ip')
 @login_required
 def get_equipment_ip(id):
-    from flask import jsonify
     equipment = Equipment.query.get_or_404(id)
     return jsonify({
         'ip_address': equipment.ip_address or ''
     })
 
+def internal_access_allowed():
+    # Usuarios autenticados o herramientas de monitoreo con INTERNAL_STATS_TOKEN
+    if current_user.is_authenticated:
+        return True
+    token = app.config.get('INTERNAL_STATS_TOKEN')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+# Estado del pool de conexiones del worker que atiende la petición
+@app.route('/internal/pool-stats')
+def internal_pool_stats():
+    if not internal_access_allowed():
+        return jsonify({'error': 'No autorizado'}), 401
+    status = pool_status(db.engine)
+    status['profile'] = app.config['DB_POOL_PROFILE']
+    return jsonify(status)
+
+# Histogramas por endpoint en formato Prometheus (ver metrics.py)
+@app.route('/metrics')
+def prometheus_metrics():
+    if not internal_access_allowed():
+        return jsonify({'error': 'No autorizado'}), 401
+    return Response(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
+    # Desarrollo local: inicializar la base de datos antes de arrancar
+    init_database()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
 
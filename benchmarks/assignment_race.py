@@ -0,0 +1,163 @@
+"""
+Prueba de concurrencia: dos asignaciones activas del mismo equipo son imposibles.
+
+Arranca varios procesos (como los workers de gunicorn) que, a la misma hora,
+envían POST /assignments/add para los mismos equipos, cada uno con una persona
+distinta y en orden aleatorio. Por cada equipo debe crearse exactamente una
+asignación activa; las demás peticiones deben recibir el aviso de conflicto
+del índice único parcial (uq_assignment_active_equipment). Al final comprueba
+en la base de datos que ningún equipo tiene más de una asignación activa y que
+el equipo apunta a la persona de esa asignación. Sale con código 1 si no, o si
+alguna petición recibió otra respuesta (un error en lugar del aviso de conflicto).
+
+Con --drop-index se borra el índice antes de empezar: sin él la ruta ya no
+comprueba nada y la prueba muestra las asignaciones duplicadas.
+
+Ejecutar:
+    python benchmarks/assignment_race.py                          # SQLite temporal
+    python benchmarks/assignment_race.py --workers 16 --equipment 200
+    python benchmarks/assignment_race.py --database-url postgresql://...   # base de pruebas
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKER = r'''
+import json, os, random, re, sys, time
+sys.path.insert(0, {root!r})
+from app import app
+app.config['WTF_CSRF_ENABLED'] = False
+client = app.test_client()
+response = client.post('/login', data={{'username': 'admin', 'password': os.environ.get('ADMIN_PASSWORD') or 'admin123'}})
+if response.status_code != 302 or not response.location.endswith('/dashboard'):
+    alert = re.search(r'role="alert">\s*([^<]+)', response.get_data(as_text=True))
+    sys.exit(f"Worker {worker}: no se pudo iniciar sesión: {{response.status_code}} "
+             f"{{alert.group(1).strip() if alert else ''}}".strip())
+equipment_ids = {equipment_ids!r}
+random.Random({worker}).shuffle(equipment_ids)
+counts, errors = {{'creadas': 0, 'conflictos': 0, 'errores': 0}}, []
+time.sleep(max(0, {start_at!r} - time.time()))
+for equipment_id in equipment_ids:
+    response = client.post('/assignments/add', data={{
+        'equipment_id': equipment_id, 'personnel_id': {personnel_id}, 'assignment_date': '2024-01-01',
+        'status': 'Activa'}})
+    body = response.get_data(as_text=True)
+    if response.status_code == 302 and response.location.endswith('/assignments'):
+        counts['creadas'] += 1
+    elif 'ya tiene una asignación activa' in body:
+        counts['conflictos'] += 1
+    else:
+        counts['errores'] += 1
+        # Estado y primer aviso de la página (p. ej. "Error al crear asignación: ...")
+        alert = re.search(r'role="alert">\s*([^<]+)', body)
+        errors.append(f"{{response.status_code}} {{alert.group(1).strip() if alert else ''}}".strip())
+print(json.dumps({{'counts': counts, 'errors': errors[:5]}}))
+'''
+
+
+def start_worker(worker, equipment_ids, personnel_id, start_at, env, workdir):
+    code = WORKER.format(root=ROOT, worker=worker, equipment_ids=equipment_ids, personnel_id=personnel_id,
+                         start_at=start_at)
+    return subprocess.Popen([sys.executable, '-c', code], env=env, cwd=workdir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def collect(process):
+    stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        # Un worker que no pudo iniciar sesión (o que falló) explica el motivo en stderr
+        sys.exit(stderr.strip())
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8, help='procesos que asignan a la vez')
+    parser.add_argument('--equipment', type=int, default=50, help='equipos que todos intentan asignar')
+    parser.add_argument('--database-url', help='base de datos de pruebas (por defecto SQLite temporal)')
+    parser.add_argument('--drop-index', action='store_true',
+                        help='borra el índice único antes de empezar (muestra la condición de carrera)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='inventario-race-')
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "race.db")}'
+    # Todos los workers inician sesión a la vez: una plaza de hash por worker, en
+    # archivos propios para no competir con un servidor que corra en la máquina
+    env.setdefault('PASSWORD_HASH_QUEUE', str(args.workers))
+    env.setdefault('PASSWORD_HASH_LOCK_DIR', os.path.join(workdir, 'password-hash'))
+    os.environ.update(env)
+    os.chdir(workdir)
+
+    from sqlalchemy import func, text
+    from app import app, init_database
+    from models import db, Department, Personnel, Equipment, Assignment, ACTIVE_ASSIGNMENT_INDEX
+
+    init_database()
+    with app.app_context():
+        if args.drop_index:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {ACTIVE_ASSIGNMENT_INDEX}'))
+        # Filas propias de esta ejecución, así la prueba sirve en cualquier base de pruebas
+        run = f'RACE-{int(time.time())}'
+        department = Department(name=run)
+        db.session.add(department)
+        db.session.flush()
+        personnel = [Personnel(name='Worker', last_name=str(n), department_id=department.id)
+                     for n in range(args.workers)]
+        equipment = [Equipment(code=f'{run}-{n}', serial=f'{run}-{n}', equipment_type='Laptop',
+                               status='Disponible', department_id=department.id)
+                     for n in range(args.equipment)]
+        db.session.add_all(personnel + equipment)
+        db.session.commit()
+        equipment_ids = [eq.id for eq in equipment]
+        personnel_ids = [person.id for person in personnel]
+
+    # Todos los workers importan la aplicación e inician sesión antes de la hora de salida
+    start_at = time.time() + 3 + args.workers * 0.5
+    processes = [start_worker(n, equipment_ids, personnel_id, start_at, env, workdir)
+                 for n, personnel_id in enumerate(personnel_ids)]
+    totals, errors = Counter(), []
+    for process in processes:
+        result = collect(process)
+        totals.update(result['counts'])
+        errors.extend(result['errors'])
+    elapsed = time.time() - start_at
+
+    with app.app_context():
+        active = (db.session.query(Assignment.equipment_id, func.count())
+                  .filter(Assignment.status == 'Activa', Assignment.equipment_id.in_(equipment_ids))
+                  .group_by(Assignment.equipment_id).all())
+        duplicated = {equipment_id: count for equipment_id, count in active if count > 1}
+        # El equipo debe apuntar a la persona de su única asignación activa
+        mismatched = (db.session.query(Equipment.id)
+                      .join(Assignment, (Assignment.equipment_id == Equipment.id) & (Assignment.status == 'Activa'))
+                      .filter(Equipment.id.in_(equipment_ids), Equipment.assigned_to_id != Assignment.personnel_id)
+                      .count())
+        dialect = db.engine.dialect.name
+
+    requests = args.workers * args.equipment
+    print(f"{dialect}: {args.workers} workers x {args.equipment} equipos = {requests} peticiones "
+          f"en {elapsed:.1f}s" + (' (sin índice único)' if args.drop_index else ''))
+    print(f"  creadas {totals['creadas']}, conflictos {totals['conflictos']}, errores {totals['errores']}")
+    for error in sorted(set(errors)):
+        print(f"    {error}")
+    print(f"  equipos con asignación activa: {len(active)}/{args.equipment}, "
+          f"con más de una: {len(duplicated)}, equipo y asignación distintos: {mismatched}")
+
+    ok = (not duplicated and not mismatched and totals['errores'] == 0
+          and totals['creadas'] == len(active) == args.equipment)
+    print('✓ Ningún equipo quedó asignado dos veces' if ok
+          else '✗ Asignaciones duplicadas, incompletas o respuestas inesperadas')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark de arranque de workers: importar la aplicación sin tocar la base de datos.
+
+Mide, en procesos nuevos (como un worker de gunicorn), cuánto tarda en
+importarse app.py y en responder la primera petición, y cuántas sentencias SQL
+se ejecutan durante la importación. Compara el arranque actual con el
+anterior, que llamaba a create_all(), creaba el índice de búsqueda y buscaba
+el usuario admin en cada importación. También arranca varios workers a la vez
+para medir el tiempo hasta que todos están listos.
+
+Ejecutar:
+    python benchmarks/boot_time.py                      # SQLite temporal
+    python benchmarks/boot_time.py --runs 10 --workers 4
+    python benchmarks/boot_time.py --database-url postgresql://...   # base de pruebas
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = r'''
+import json, sys, time
+sys.path.insert(0, {root!r})
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+started = time.perf_counter()
+import app as app_module
+if {legacy!r}:
+    # Arranque anterior: create_tables() al importar app.py
+    from app import app, db, setup_search
+    from models import User
+    with app.app_context():
+        db.create_all()
+        setup_search()
+        User.query.filter_by(username='admin').first()
+imported = time.perf_counter() - started
+import_statements = len(statements)
+response = app_module.app.test_client().get('/login')
+ready = time.perf_counter() - started
+print(json.dumps({{'import': imported, 'ready': ready, 'statements': import_statements,
+                  'status': response.status_code}}))
+'''
+
+MODES = [('actual', False), ('anterior', True)]
+
+
+def start_worker(legacy, env, workdir):
+    code = WORKER.format(root=ROOT, legacy=legacy)
+    return subprocess.Popen([sys.executable, '-c', code], env=env, cwd=workdir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def collect(process):
+    stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(stderr)
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='arranques secuenciales por modo')
+    parser.add_argument('--workers', type=int, default=4, help='workers arrancados a la vez')
+    parser.add_argument('--database-url', help='base de datos de pruebas (por defecto SQLite temporal)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='inventario-boot-')
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "boot.db")}'
+
+    # El esquema se crea una vez, como hace `flask init-db` en el despliegue
+    subprocess.run([sys.executable, '-m', 'flask', '--app', os.path.join(ROOT, 'app.py'), 'init-db'],
+                   env=env, cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+
+    results = {}
+    for name, legacy in MODES:
+        runs = [collect(start_worker(legacy, env, workdir)) for _ in range(args.runs)]
+        started = time.perf_counter()
+        processes = [start_worker(legacy, env, workdir) for _ in range(args.workers)]
+        for process in processes:
+            collect(process)
+        results[name] = {
+            'import': statistics.median(run['import'] for run in runs) * 1000,
+            'ready': statistics.median(run['ready'] for run in runs) * 1000,
+            'statements': runs[0]['statements'],
+            'parallel': (time.perf_counter() - started) * 1000,
+        }
+
+    print(f"{'arranque':<10} {'importación':>12} {'1.ª respuesta':>14} {'SQL al importar':>16} "
+          f"{f'{args.workers} workers':>12}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['import']:>10.1f}ms {result['ready']:>12.1f}ms "
+              f"{result['statements']:>16} {result['parallel']:>10.1f}ms")
+
+    current, previous = results['actual'], results['anterior']
+    print(f"\nWorker listo {previous['ready'] - current['ready']:.1f} ms antes "
+          f"({current['statements']} sentencias SQL al importar, antes {previous['statements']})")
+    sys.exit(0 if current['statements'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Benchmark de planes de consulta: verifica que cada listado y filtro use índices.
+
+Siembra una base de datos grande, llama a cada ruta de listado/filtro con el
+cliente de pruebas de Flask, captura las consultas SQL que emite y ejecuta
+EXPLAIN sobre cada una. Falla (código de salida 1) si alguna recorre
+completa (Seq Scan / SCAN sin índice) la tabla principal de la ruta.
+
+Ejecutar:
+    python benchmarks/explain_plans.py                      # SQLite temporal
+    python benchmarks/explain_plans.py --rows 200000
+    python benchmarks/explain_plans.py --database-url postgresql://...   # base vacía de pruebas
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EQUIPMENT_TYPES = ['Laptop', 'Desktop', 'Monitor', 'Impresora', 'Router', 'Switch', 'Teclado', 'Mouse']
+STATUSES = ['Disponible'] * 5 + ['Asignado'] * 4 + ['Mantenimiento', 'Baja']
+
+# (ruta, tabla que debe leerse por índice)
+ROUTES = [
+    ('/equipment', 'equipment'),
+    ('/equipment?after={cursor}', 'equipment'),
+    ('/equipment?status=Mantenimiento', 'equipment'),
+    ('/equipment?type=Router', 'equipment'),
+    ('/equipment?department={department_id}', 'equipment'),
+    ('/equipment?area={area_id}', 'equipment'),
+    ('/equipment?date={date}', 'equipment'),
+    ('/equipment?search=S/ULA:1234', 'equipment'),
+    ('/api/equipment/search?q=S/ULA:1234', 'equipment'),
+    ('/assignments', 'assignment'),
+    ('/assignments/history', 'assignment'),
+    ('/assignments/history?personnel_id={personnel_id}', 'assignment'),
+    ('/assignments/history?equipment_id={equipment_id}', 'assignment'),
+    ('/assignments/history?date_from={date}&date_to={date}', 'assignment'),
+    ('/personnel', 'personnel'),
+    ('/api/personnel/search?q=mar', 'personnel'),
+    ('/departments', 'department'),
+    ('/areas', 'area'),
+]
+
+
+def seed(db, models, rows):
+    """Inserta datos sintéticos con inserciones masivas (sin el unit of work del ORM)."""
+    Department, Area, Personnel, Equipment, Assignment = models
+    rng = random.Random(42)
+    base = datetime(2022, 1, 1)
+    n_departments, n_areas, n_personnel = 50, 30, max(rows // 10, 100)
+
+    db.session.execute(db.insert(Department), [
+        {'id': i, 'name': f'Departamento {i}', 'created_at': base} for i in range(1, n_departments + 1)])
+    db.session.execute(db.insert(Area), [
+        {'id': i, 'name': f'Biblioteca {i}', 'created_at': base} for i in range(1, n_areas + 1)])
+    names = ['María', 'José', 'Ana', 'Luis', 'Carmen', 'Pedro', 'Marta', 'Juan']
+    db.session.execute(db.insert(Personnel), [
+        {'id': i, 'name': rng.choice(names), 'last_name': f'Apellido{i}', 'employee_id': f'E{i:06d}',
+         'department_id': rng.randint(1, n_departments), 'area_id': rng.randint(1, n_areas), 'created_at': base}
+        for i in range(1, n_personnel + 1)])
+
+    batch = []
+    for i in range(1, rows + 1):
+        created = base + timedelta(minutes=i * 7)
+        batch.append({
+            'id': i, 'code': f'S/ULA:{i}', 'serial': f'SN{i:08d}',
+            'equipment_type': rng.choice(EQUIPMENT_TYPES), 'brand': 'Marca', 'model': f'M{i % 97}',
+            'status': rng.choice(STATUSES), 'department_id': rng.randint(1, n_departments),
+            'area_id': rng.randint(1, n_areas) if i % 4 else None,
+            'assigned_to_id': rng.randint(1, n_personnel) if i % 2 else None,
+            'registration_date': created, 'created_at': created, 'updated_at': created,
+        })
+        if len(batch) == 5000:
+            db.session.execute(db.insert(Equipment), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(Equipment), batch)
+
+    batch = []
+    for i in range(1, rows + 1):
+        equipment_id = rng.randint(1, rows)
+        batch.append({
+            # Las activas usan equipos distintos (índice único de asignaciones activas)
+            'id': i, 'equipment_id': i if i % 10 == 0 else equipment_id, 'personnel_id': rng.randint(1, n_personnel),
+            'assignment_date': base + timedelta(minutes=i * 7),
+            'status': 'Activa' if i % 10 == 0 else 'Devuelta', 'assigned_by': 'admin',
+        })
+        if len(batch) == 5000:
+            db.session.execute(db.insert(Assignment), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(Assignment), batch)
+    db.session.commit()
+
+
+def login(client):
+    """Inicia sesión como admin o termina: sin sesión solo se mediría la página de login."""
+    response = client.post('/login', data={'username': 'admin',
+                                           'password': os.environ.get('ADMIN_PASSWORD') or 'admin123'})
+    if response.status_code != 302 or not response.location.endswith('/dashboard'):
+        alert = re.search(r'role="alert">\s*([^<]+)', response.get_data(as_text=True))
+        sys.exit(f"No se pudo iniciar sesión como admin: {response.status_code} "
+                 f"{alert.group(1).strip() if alert else ''}".strip())
+    return client
+
+
+def explain(conn, dialect, statement, parameters):
+    """Devuelve las líneas del plan y las tablas recorridas completas."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    if dialect == 'postgresql':
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        plan = cursor.fetchone()[0][0]['Plan']
+        lines, full_scans = [], set()
+
+        def walk(node, depth):
+            relation = node.get('Relation Name')
+            lines.append('  ' * depth + node['Node Type'] + (f' on {relation}' if relation else '') +
+                         (f" using {node['Index Name']}" if node.get('Index Name') else ''))
+            if node['Node Type'] == 'Seq Scan' and relation:
+                full_scans.add(relation)
+            for child in node.get('Plans', []):
+                walk(child, depth + 1)
+        walk(plan, 0)
+        return lines, full_scans
+
+    cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+    lines, full_scans = [], set()
+    for row in cursor.fetchall():
+        detail = row[-1]
+        lines.append(detail)
+        words = detail.split()
+        # 'SCAN tabla' sin 'USING ... INDEX' es un recorrido completo
+        if len(words) >= 2 and words[0] == 'SCAN' and 'INDEX' not in detail and 'VIRTUAL' not in detail:
+            full_scans.add(words[1])
+    return lines, full_scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000, help='equipos y asignaciones a sembrar')
+    parser.add_argument('--database-url', help='base de datos vacía de pruebas (por defecto SQLite temporal)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='inventario-bench-')
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    # Plazas de hash propias: un servidor en la misma máquina no bloquea el inicio de sesión
+    os.environ.setdefault('PASSWORD_HASH_LOCK_DIR', os.path.join(workdir, 'password-hash'))
+    os.chdir(workdir)
+
+    from sqlalchemy import event
+    from app import app, init_database
+    from models import db, Department, Area, Personnel, Equipment, Assignment
+    from migrate_indexes import create_indexes
+    from pagination import encode_cursor
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    failures = 0
+    init_database()
+    with app.app_context():
+        if Equipment.query.first() is None:
+            started = time.perf_counter()
+            seed(db, (Department, Area, Personnel, Equipment, Assignment), args.rows)
+            print(f"Sembrados {args.rows} equipos y asignaciones en {time.perf_counter() - started:.1f}s")
+        create_indexes(db.engine)
+        from search import setup_search
+        setup_search(rebuild=True)
+
+        middle = Equipment.query.order_by(Equipment.created_at.desc(), Equipment.id.desc()) \
+            .offset(args.rows // 2).first()
+        values = {
+            'cursor': encode_cursor(middle, [Equipment.created_at, Equipment.id]),
+            'department_id': middle.department_id,
+            'area_id': 1,
+            'personnel_id': 1,
+            'equipment_id': middle.id,
+            'date': middle.registration_date.strftime('%Y-%m-%d'),
+        }
+
+        captured = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                captured.append((statement, parameters))
+
+        client = app.test_client()
+        login(client)
+        dialect = db.engine.dialect.name
+
+        for route, table in ROUTES:
+            url = route.format(**values)
+            captured.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+            statements = list(captured)
+            failed = response.status_code != 200
+            plans = []
+            with db.engine.connect() as conn:
+                for statement, parameters in statements:
+                    if f'FROM {table}' not in statement and f'JOIN {table}' not in statement:
+                        continue
+                    lines, full_scans = explain(conn, dialect, statement, parameters)
+                    plans.append(lines)
+                    if table in full_scans:
+                        failed = True
+            failures += failed
+            print(f"\n[{'FAIL' if failed else 'OK'}] {url}  "
+                  f"({response.status_code}, {elapsed:.1f} ms, {len(statements)} consultas)")
+            for lines in plans:
+                for line in lines:
+                    print(f"      {line}")
+
+    print(f"\n{len(ROUTES) - failures}/{len(ROUTES)} rutas usan índices")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
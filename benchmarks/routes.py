@@ -0,0 +1,224 @@
+"""
+Benchmark de rutas con presupuesto de consultas SQL.
+
+Siembra una base de datos (la misma siembra que explain_plans.py), llama a cada
+ruta de app.py con el cliente de pruebas de Flask y registra por ruta los
+percentiles de latencia y el número de sentencias SQL. Falla (código de
+salida 1) si una ruta supera su presupuesto de consultas, devuelve un estado
+inesperado o si app.py tiene una ruta que no está en ROUTES ni en SKIPPED: así
+una relación lazy nueva en una plantilla (N+1) aparece como regresión.
+
+La primera llamada de cada ruta se mide aparte (cachés vacías); el
+presupuesto se compara con el máximo de todas las llamadas. Los resultados se
+guardan en JSON para comparar ejecuciones.
+
+Ejecutar:
+    python benchmarks/routes.py                                  # SQLite temporal
+    python benchmarks/routes.py --rows 20000 --iterations 50
+    python benchmarks/routes.py --compare benchmarks/results/routes_20240101_120000.json
+    python benchmarks/routes.py --database-url postgresql://...  # base vacía de pruebas
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# (endpoint, URL, presupuesto de consultas, estado esperado, sesión iniciada)
+# Los presupuestos no dependen del tamaño de la base: una ruta cuyo número de
+# consultas crece con las filas tiene un N+1.
+ROUTES = [
+    ('index', '/', 1, 302, True),
+    ('login', '/login', 0, 200, False),
+    ('register', '/register', 0, 200, False),
+    ('dashboard', '/dashboard', 2, 200, True),
+    ('departments', '/departments', 2, 200, True),
+    ('add_department', '/departments/add', 0, 200, True),
+    ('edit_department', '/departments/edit/{department_id}', 1, 200, True),
+    ('equipment', '/equipment', 6, 200, True),
+    ('equipment', '/equipment?status=Mantenimiento&type=Router', 6, 200, True),
+    ('add_equipment', '/equipment/add', 3, 200, True),
+    ('export_equipment', '/equipment/export?status=Baja', 1, 200, True),
+    ('import_equipment_view', '/equipment/import', 0, 200, True),
+    ('view_equipment', '/equipment/view/{equipment_id}', 5, 200, True),
+    ('edit_equipment', '/equipment/edit/{equipment_id}', 5, 200, True),
+    ('areas', '/areas', 2, 200, True),
+    ('add_area', '/areas/add', 0, 200, True),
+    ('edit_area', '/areas/edit/{area_id}', 1, 200, True),
+    ('personnel', '/personnel', 2, 200, True),
+    ('add_personnel', '/personnel/add', 2, 200, True),
+    ('edit_personnel', '/personnel/edit/{personnel_id}', 3, 200, True),
+    ('assignments', '/assignments', 2, 200, True),
+    ('assignments_history', '/assignments/history', 2, 200, True),
+    ('assignments_history', '/assignments/history?personnel_id={personnel_id}', 2, 200, True),
+    ('add_assignment', '/assignments/add', 0, 200, True),
+    ('edit_assignment', '/assignments/edit/{assignment_id}', 4, 200, True),
+    ('api_search_equipment', '/api/equipment/search?q=S/ULA:12', 2, 200, True),
+    ('api_search_personnel', '/api/personnel/search?q=mar', 1, 200, True),
+    ('get_equipment_ip', '/api/equipment/{equipment_id}/ip', 1, 200, True),
+    ('internal_pool_stats', '/internal/pool-stats', 0, 200, True),
+    ('prometheus_metrics', '/metrics', 0, 200, True),
+]
+
+# Rutas que no se miden y por qué
+SKIPPED = {
+    'static': 'archivos estáticos, sin base de datos',
+    'logout': 'cierra la sesión del cliente del benchmark',
+    'uploaded_file': 'la siembra no incluye fotos',
+    'image_variant': 'la siembra no incluye fotos',
+    'equipment_import_report': 'requiere un reporte de importación previo',
+    'delete_department': 'solo POST, borra datos',
+    'delete_equipment': 'solo POST, borra datos',
+    'delete_area': 'solo POST, borra datos',
+    'delete_personnel': 'solo POST, borra datos',
+    'delete_assignment': 'solo POST, borra datos',
+    'return_assignment': 'solo POST, modifica datos',
+    'bulk_equipment': 'solo POST, modifica datos',
+    'return_personnel_equipment': 'solo POST, modifica datos',
+    'bulk_return_assignments': 'solo POST, modifica datos',
+}
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', '-C', ROOT, 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path):
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {route['url']: route for route in json.load(f)['routes']}
+    print(f"\nComparación con {previous_path}")
+    print(f"{'ruta':<52} {'p50 antes':>10} {'p50 ahora':>10} {'consultas':>12}")
+    for route in results:
+        before = previous.get(route['url'])
+        if before is None:
+            continue
+        print(f"{route['url'][:52]:<52} {before['p50_ms']:>8.1f}ms {route['p50_ms']:>8.1f}ms "
+              f"{before['queries_max']:>5} → {route['queries_max']:<4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='equipos y asignaciones a sembrar')
+    parser.add_argument('--iterations', type=int, default=20, help='llamadas por ruta')
+    parser.add_argument('--database-url', help='base de datos vacía de pruebas (por defecto SQLite temporal)')
+    parser.add_argument('--output', help='archivo JSON de resultados (por defecto benchmarks/results/)')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    # Rutas relativas al directorio actual, antes de cambiar al directorio temporal
+    output = os.path.abspath(args.output) if args.output else os.path.join(
+        ROOT, 'benchmarks', 'results', f"routes_{datetime.now():%Y%m%d_%H%M%S}.json")
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    workdir = tempfile.mkdtemp(prefix='inventario-routes-')
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    # Plazas de hash propias: un servidor en la misma máquina no bloquea el inicio de sesión
+    os.environ.setdefault('PASSWORD_HASH_LOCK_DIR', os.path.join(workdir, 'password-hash'))
+    os.chdir(workdir)
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import app, init_database
+    from models import db, Department, Area, Personnel, Equipment, Assignment
+    from explain_plans import login, seed
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    init_database()
+    with app.app_context():
+        if Equipment.query.first() is None:
+            started = time.perf_counter()
+            seed(db, (Department, Area, Personnel, Equipment, Assignment), args.rows)
+            print(f"Sembrados {args.rows} equipos y asignaciones en {time.perf_counter() - started:.1f}s")
+        from search import setup_search
+        setup_search(rebuild=True)
+        values = {
+            'department_id': Department.query.first().id,
+            'area_id': Area.query.first().id,
+            'personnel_id': Personnel.query.first().id,
+            'equipment_id': Equipment.query.filter(Equipment.assigned_to_id.isnot(None)).first().id,
+            'assignment_id': Assignment.query.first().id,
+        }
+        dialect = db.engine.dialect.name
+
+    covered = {endpoint for endpoint, *_ in ROUTES}
+    missing = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                     if rule.endpoint not in covered and rule.endpoint not in SKIPPED)
+
+    statements = []
+    event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    authenticated = login(app.test_client())
+    anonymous = app.test_client()
+
+    results, failures = [], 0
+    print(f"\n{'ruta':<52} {'estado':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'consultas':>10} {'límite':>6}")
+    for endpoint, route, budget, expected_status, logged_in in ROUTES:
+        url = route.format(**values)
+        client = authenticated if logged_in else anonymous
+        timings, counts, status = [], [], None
+        for _ in range(args.iterations):
+            statements.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            response.close()
+            timings.append((time.perf_counter() - started) * 1000)
+            counts.append(len(statements))
+            status = response.status_code
+        failed = status != expected_status or max(counts) > budget
+        failures += failed
+        result = {
+            'endpoint': endpoint, 'url': url, 'status': status,
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'cold_ms': round(timings[0], 2),
+            'queries_cold': counts[0],
+            'queries_max': max(counts),
+            'queries_median': statistics.median(counts),
+            'budget': budget, 'ok': not failed,
+        }
+        results.append(result)
+        print(f"{url[:52]:<52} {status:>6} {result['p50_ms']:>6.1f}ms {result['p95_ms']:>6.1f}ms "
+              f"{result['p99_ms']:>6.1f}ms {max(counts):>10} {budget:>6}" + ('  FAIL' if failed else ''))
+
+    for endpoint in missing:
+        print(f"FAIL  la ruta {endpoint} no tiene presupuesto (agrégala a ROUTES o SKIPPED)")
+    failures += len(missing)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {'timestamp': datetime.now().isoformat(timespec='seconds'), 'revision': git_revision(),
+                     'dialect': dialect, 'rows': args.rows, 'iterations': args.iterations},
+            'routes': results,
+            'missing': missing,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados en {output}")
+
+    if previous:
+        compare(results, previous)
+
+    print(f"\n{len(results) - sum(not r['ok'] for r in results)}/{len(results)} rutas dentro del presupuesto")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Operaciones masivas sobre equipos y asignaciones.
+
+Cada operación es un UPDATE por tabla sobre todas las filas que cumplen la
+condición, en una sola transacción: devolver todo lo que tiene una persona,
+cambiar el estatus o la biblioteca de los equipos seleccionados (o de todos los
+que cumplen los filtros del listado). Las filas no se cargan en la sesión; las
+cachés y los ETag de los listados se invalidan igual, porque los UPDATE pasan
+por session.execute (ver cache.py y conditional.py).
+
+Cuando una operación escribe en las dos tablas, primero se actualiza
+assignment con las condiciones evaluadas sobre equipment sin modificar, y la
+sentencia sobre equipment usa los ids que devolvió la de assignment; así un
+filtro por estatus o biblioteca selecciona las mismas filas en ambas. Cada función recibe una
+lista de condiciones y devuelve BulkResult con las filas afectadas por tabla.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from models import db, Equipment, Assignment
+
+BulkResult = namedtuple('BulkResult', 'equipment assignments')
+
+# Estatus que se pueden fijar en bloque ('Asignado' requiere una persona)
+BULK_STATUSES = ['Disponible', 'Mantenimiento', 'Baja']
+
+# Ids por sentencia con IN (SQLite admite 32766 parámetros por sentencia)
+ID_CHUNK = 5000
+
+
+def _update_statement(model, conditions, **values):
+    # Nueva versión de cada fila: un formulario abierto antes detecta el cambio (ver concurrency.py)
+    return update(model).where(*conditions).values(version_id=model.version_id + 1, **values) \
+        .execution_options(synchronize_session=False)
+
+
+def _update(model, conditions, **values):
+    return db.session.execute(_update_statement(model, conditions, **values)).rowcount
+
+
+def _update_ids(model, ids, **values):
+    # En orden de id y por partes: las filas se bloquean siempre en el mismo orden
+    ids = sorted(set(ids))
+    return sum(_update(model, [model.id.in_(ids[start:start + ID_CHUNK])], **values)
+               for start in range(0, len(ids), ID_CHUNK))
+
+
+def _close_active(conditions, now):
+    # Asignaciones primero: `conditions` puede leer columnas de equipment (p. ej. el
+    # filtro por estatus del listado) y debe verlas antes de liberar los equipos.
+    # Los equipos a liberar son exactamente los de las asignaciones cerradas: los
+    # devuelve el propio UPDATE (RETURNING en PostgreSQL y SQLite) o, sin RETURNING,
+    # se leen antes y el UPDATE se limita a esas asignaciones
+    active = [Assignment.status == 'Activa', *conditions]
+    values = dict(status='Devuelta', return_date=now, updated_at=now)
+    if db.session.get_bind().dialect.update_returning:
+        statement = _update_statement(Assignment, active, **values).returning(Assignment.equipment_id)
+        equipment_ids = db.session.execute(statement).scalars().all()
+        assignments = len(equipment_ids)
+    else:
+        rows = db.session.query(Assignment.id, Assignment.equipment_id).filter(*active).all()
+        assignments = _update_ids(Assignment, [row.id for row in rows], **values)
+        equipment_ids = [row.equipment_id for row in rows]
+    equipment = _update_ids(Equipment, equipment_ids,
+                            assigned_to_id=None, assignment_date=None, status='Disponible', updated_at=now)
+    return equipment, assignments
+
+
+def return_assignments(conditions):
+    """Devuelve las asignaciones activas que cumplen `conditions` y libera sus equipos."""
+    try:
+        result = BulkResult(*_close_active(conditions, datetime.utcnow()))
+        db.session.commit()
+        return result
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def set_equipment_status(conditions, status):
+    """Cambia el estatus de los equipos; los que estaban asignados se devuelven antes."""
+    if status not in BULK_STATUSES:
+        raise ValueError(f'Estatus no permitido en bloque: {status}')
+    now = datetime.utcnow()
+    try:
+        # Asignaciones primero, sin tocar equipment: las dos sentencias evalúan
+        # `conditions` sobre los mismos valores (p. ej. un filtro por estatus)
+        assignments = _update(Assignment, [Assignment.status == 'Activa',
+                                           Assignment.equipment_id.in_(select(Equipment.id).where(*conditions))],
+                              status='Devuelta', return_date=now, updated_at=now)
+        equipment = _update(Equipment, conditions, status=status, assigned_to_id=None,
+                            assignment_date=None, updated_at=now)
+        db.session.commit()
+        return BulkResult(equipment, assignments)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def move_equipment(conditions, area_id):
+    """Mueve los equipos a otra biblioteca (None los deja sin biblioteca)."""
+    try:
+        equipment = _update(Equipment, conditions, area_id=area_id, updated_at=datetime.utcnow())
+        db.session.commit()
+        return BulkResult(equipment, 0)
+    except Exception:
+        db.session.rollback()
+        raise
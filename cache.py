@@ -0,0 +1,191 @@
+"""
+Caché con expiración (TTL) e invalidación por tabla.
+
+Cada tabla tiene un contador de versión que se incrementa cuando una
+transacción que escribió en ella hace commit. Las entradas guardan las
+versiones de las tablas de las que dependen y se recalculan si alguna cambió.
+
+El almacenamiento es intercambiable: por defecto un LRU en memoria del proceso;
+si se define CACHE_REDIS_URL, valores y versiones se guardan en Redis y se
+comparten entre los workers de gunicorn. Con el LRU local cada worker tiene sus
+propias versiones, por lo que el TTL acota cuánto puede tardar en ver cambios
+hechos por otro worker; las entradas que no pueden esperar tanto pasan además
+contadores compartidos en `shared_versions` (ver lookups.py).
+
+Las escrituras hechas con el ORM se detectan solas; las que se hagan con SQL
+directo (inserciones masivas, UPDATE por lotes) deben llamar a bump_tables().
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class LocalCache:
+    """Diccionario LRU con expiración opcional por entrada, seguro entre hilos."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        # Los contadores de versión no participan del LRU: si se desalojaran
+        # volverían a cero y podrían validar entradas antiguas
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def counters(self, keys):
+        return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Almacenamiento en Redis compartido entre procesos (requiere el paquete redis)."""
+
+    def __init__(self, url, prefix='inventario:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_REDIS_URL requiere el paquete redis (pip install redis)')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def counters(self, keys):
+        if not keys:
+            return []
+        return [int(raw) if raw is not None else 0
+                for raw in self._client.mget([self.prefix + key for key in keys])]
+
+    def incr(self, key):
+        return self._client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+
+_backend = LocalCache()
+
+
+def init_app(app):
+    """Elige el almacenamiento según la configuración de la aplicación."""
+    global _backend
+    if app.config.get('CACHE_REDIS_URL'):
+        _backend = RedisCache(app.config['CACHE_REDIS_URL'])
+    else:
+        _backend = LocalCache(app.config.get('CACHE_MAX_ENTRIES', 1024))
+
+
+def get_backend():
+    return _backend
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def table_versions(names):
+    return tuple(_backend.counters([_version_key(name) for name in names]))
+
+
+def table_version(name):
+    return table_versions([name])[0]
+
+
+def bump_tables(*names):
+    """Invalida las entradas que dependen de las tablas indicadas."""
+    for name in names:
+        _backend.incr(_version_key(name))
+
+
+def memoize(key, tables, builder, ttl=None, shared_versions=()):
+    """
+    Devuelve el valor cacheado de `key` o lo calcula con `builder()`.
+
+    El valor se descarta cuando expira `ttl` (segundos), cuando cambia alguna
+    de las tablas de `tables` o cuando cambia `shared_versions`: contadores que
+    todos los workers leen igual (p. ej. table_version de la base de datos).
+    """
+    versions = table_versions(tables) + tuple(shared_versions)
+    entry = _backend.get(key)
+    if entry is not None and tuple(entry[0]) == versions:
+        return entry[1]
+    value = builder()
+    _backend.set(key, (versions, value), ttl)
+    return value
+
+
+def _changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    tables = _changed_tables(session)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        tables.update(table.name for table in inspect(obj).mapper.tables)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(orm_execute_state):
+    # UPDATE/DELETE/INSERT del ORM ejecutados fuera del flush (session.execute(update(...)))
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _changed_tables(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_tables(session):
+    tables = session.info.pop('changed_tables', None)
+    if tables:
+        bump_tables(*tables)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_tables(session):
+    session.info.pop('changed_tables', None)
@@ -0,0 +1,52 @@
+"""
+Control de concurrencia optimista para las ediciones de equipos y asignaciones.
+
+Equipment y Assignment tienen una columna version_id (version_id_col del
+mapper): cada UPDATE del ORM lleva `WHERE version_id = <versión leída>` y la
+incrementa. Si otra petición cambió la fila entre la lectura y el commit, el
+UPDATE no afecta ninguna fila y SQLAlchemy lanza StaleDataError; no se
+bloquea nada mientras el formulario está abierto.
+
+El formulario lleva en un campo oculto la versión con la que se abrió. Si al
+guardar ya no coincide (o el commit lanza StaleDataError), la edición no se
+aplica: se vuelve a mostrar el formulario con lo que escribió el usuario, una
+tabla con los campos que difieren del valor guardado y la versión actual, de
+modo que guardar otra vez sobrescribe a sabiendas.
+"""
+from wtforms import SelectField
+
+# Campos que no se comparan en la pantalla de conflicto
+IGNORED_FIELD_TYPES = {'CSRFTokenField', 'HiddenField', 'SubmitField', 'FileField', 'MultipleFileField'}
+
+
+def is_stale(form, obj):
+    """True si el formulario se abrió con una versión anterior de `obj`."""
+    try:
+        return int(form.version_id.data) != obj.version_id
+    except (TypeError, ValueError):
+        return True
+
+
+def _display(field):
+    if isinstance(field, SelectField):
+        return dict(field.choices).get(field.data, field.data)
+    return field._value()
+
+
+def differences(form, current_form):
+    """Campos cuyo valor enviado difiere del guardado: [(etiqueta, enviado, guardado)]."""
+    rows = []
+    for field in form:
+        if field.type in IGNORED_FIELD_TYPES:
+            continue
+        submitted, saved = _display(field), _display(current_form[field.name])
+        if submitted != saved:
+            rows.append((field.label.text, submitted or '-', saved or '-'))
+    return rows
+
+
+def resolve(form, current, current_form):
+    """Diferencias con la versión actual; `form` queda listo para sobrescribirla al reenviarse."""
+    rows = differences(form, current_form)
+    form.version_id.data = current.version_id
+    return rows
@@ -0,0 +1,148 @@
+"""
+Respuestas condicionales (ETag / 304 Not Modified) para los listados.
+
+Cada tabla listada tiene una fila en table_version cuyo contador se incrementa
+al hacer commit, en la misma transacción, de cualquier escritura hecha con la
+sesión (flush del ORM o INSERT/UPDATE/DELETE ejecutados con session.execute).
+El ETag de una página combina esos contadores con la vista, sus filtros y el
+usuario, así que se valida con una sola consulta por llave primaria: si el
+navegador envía el mismo ETag se responde 304 sin ejecutar la consulta
+principal ni renderizar la plantilla. Al vivir en la base de datos, el contador es el mismo para todos los
+workers, con o sin Redis.
+
+No se envía Last-Modified: borrar una fila no mueve ninguna fecha, así que
+If-Modified-Since podría validar una página que ya no es correcta.
+
+Las escrituras con SQL directo fuera de la sesión (COPY) deben llamar a
+mark_changed() antes del commit.
+"""
+import hashlib
+import os
+import time
+from functools import wraps
+from itertools import chain
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, TableVersion
+
+VERSIONED_TABLES = ('department', 'area', 'personnel', 'equipment', 'assignment')
+
+_templates_fingerprint = None
+
+
+def ensure_versions():
+    """Crea las filas de table_version que falten (idempotente, lo llama init-db)."""
+    existing = {name for (name,) in db.session.query(TableVersion.name)}
+    for name in VERSIONED_TABLES:
+        if name not in existing:
+            db.session.add(TableVersion(name=name, version=0))
+    db.session.commit()
+
+
+def _changed_tables(session):
+    return session.info.setdefault('versioned_tables', set())
+
+
+def mark_changed(session, *tables):
+    """Registra tablas escritas con SQL fuera de la sesión (COPY) para el próximo commit."""
+    _changed_tables(session).update(tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    _changed_tables(session).update(table.name for obj in chain(session.new, session.dirty, session.deleted)
+                                    for table in inspect(obj).mapper.tables)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None:
+            _changed_tables(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_changed_tables(session):
+    # Se incrementa una vez por transacción, justo antes del commit: las filas de
+    # table_version quedan bloqueadas el menor tiempo posible y siempre en el mismo
+    # orden, así dos transacciones no se bloquean en orden cruzado
+    session.flush()
+    tables = sorted(session.info.pop('versioned_tables', set()) & set(VERSIONED_TABLES))
+    if tables:
+        column = TableVersion.__table__.c
+        session.connection().execute(TableVersion.__table__.update()
+                                     .where(column.name.in_(tables))
+                                     .values(version=column.version + 1))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_tables(session):
+    session.info.pop('versioned_tables', None)
+
+
+def table_versions(tables):
+    """Contadores de las tablas en orden, o None si falta alguna fila (sin init-db)."""
+    versions = dict(db.session.query(TableVersion.name, TableVersion.version)
+                    .filter(TableVersion.name.in_(tables)))
+    if len(versions) < len(set(tables)):
+        return None
+    return [versions[name] for name in tables]
+
+
+def _templates_version():
+    # Cambiar una plantilla en un despliegue invalida las páginas ya guardadas
+    global _templates_fingerprint
+    if _templates_fingerprint is None:
+        digest = hashlib.sha1()
+        for root, _, files in sorted(os.walk(os.path.join(current_app.root_path, current_app.template_folder))):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        _templates_fingerprint = digest.hexdigest()
+    return _templates_fingerprint
+
+
+def list_etag(versions, signed_images=False):
+    parts = [current_app.config.get('LIST_ETAG_SALT') or '', _templates_version(),
+             request.endpoint, repr(sorted(request.args.items(multi=True))),
+             str(current_user.id), current_user.username, repr(versions)]
+    if signed_images:
+        # Las URLs firmadas de las fotos cambian en cada ventana de IMAGE_URL_TTL
+        parts.append(str(int(time.time()) // current_app.config['IMAGE_URL_TTL']))
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def conditional_list(*tables, signed_images=False):
+    """
+    Decorador de un listado que depende de `tables`: responde 304 si el
+    navegador ya tiene la página. Va debajo de @login_required.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Un mensaje flash pendiente debe mostrarse: la página no es la guardada
+            if request.method != 'GET' or '_flashes' in session:
+                return view(*args, **kwargs)
+            versions = table_versions(tables)
+            if versions is None:
+                return view(*args, **kwargs)
+            etag = list_etag(versions, signed_images)
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Solo en el navegador del usuario y revalidando siempre
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -1,5 +1,7 @@
 import os
 
+from db_pool import engine_options
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     
@@ -25,7 +27,56 @@ class Config:
         SQLALCHEMY_DATABASE_URI = f'postgresql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}'
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Pool de conexiones (ver db_pool.py): default, gunicorn-threads o pgbouncer
+    DB_POOL_PROFILE = os.environ.get('DB_POOL_PROFILE') or 'default'
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 1))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        DB_POOL_PROFILE, SQLALCHEMY_DATABASE_URI,
+        threads=GUNICORN_THREADS,
+        pool_size=int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None,
+        max_overflow=int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None,
+        pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),  # Segundos esperando una conexión libre
+        pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 300)),  # Segundos antes de renovar una conexión
+    )
+
+    # Token para consultar /internal/* sin sesión (monitoreo); vacío = solo usuarios autenticados
+    INTERNAL_STATS_TOKEN = os.environ.get('INTERNAL_STATS_TOKEN')
+    # Cabecera Server-Timing con consultas SQL y tiempos de cada petición (ver metrics.py)
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '1').lower() in ('1', 'true', 'yes')
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))  # Hilos por worker que generan miniaturas
+    # Delegar el envío de archivos al proxy (X-Sendfile, p. ej. nginx/Apache). Sin proxy,
+    # gunicorn ya usa sendfile() a través de wsgi.file_wrapper
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    IMAGE_URL_TTL = int(os.environ.get('IMAGE_URL_TTL', 3600))  # Segundos, ventana de validez de las URLs firmadas de fotos
+    # Importación masiva de equipos: tamaño máximo del archivo y carpeta de reportes de errores
+    IMPORT_MAX_CONTENT_LENGTH = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH', 64 * 1024 * 1024))  # 64MB
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 2000))
+    IMPORT_REPORT_FOLDER = os.environ.get('IMPORT_REPORT_FOLDER') or 'instance/import_reports'
+    ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', 50))  # Filas por página en los listados
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 30))  # Segundos
+    LOOKUP_CACHE_TTL = int(os.environ.get('LOOKUP_CACHE_TTL', 300))  # Segundos, listas de opciones de formularios
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # Segundos, usuario autenticado por proceso
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 1024))  # Usuarios cacheados por proceso
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))  # Filas renderizadas por proceso
+    # Se agrega a los ETag de los listados: un despliegue nuevo invalida las páginas guardadas
+    LIST_ETAG_SALT = os.environ.get('LIST_ETAG_SALT') or os.environ.get('RENDER_GIT_COMMIT') or ''
+
+    # Hash de contraseñas (ver password_hashing.py). El método incluye todos los parámetros
+    # en formato de Werkzeug; al cambiarlo, los hashes se actualizan al iniciar sesión
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))  # Procesos por worker; 0 = en el mismo proceso
+    # Operaciones en curso en toda la máquina (todos los workers e hilos); menor que workers × hilos
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 2))
+    PASSWORD_HASH_LOCK_DIR = os.environ.get('PASSWORD_HASH_LOCK_DIR')  # Archivos de las plazas; por defecto en /tmp
+    PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 5))  # Segundos de espera por una plaza libre
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))  # Segundos
+
+    # Caché compartida entre workers (opcional, requiere el paquete redis)
+    # Ejemplo: redis://localhost:6379/0
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
 
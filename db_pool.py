@@ -0,0 +1,170 @@
+"""
+Perfiles del pool de conexiones y métricas del pool.
+
+El perfil se elige con DB_POOL_PROFILE:
+
+- default: pool por worker con pre-ping y reciclado de conexiones, para
+  gunicorn con workers síncronos (un hilo por worker).
+- gunicorn-threads: pool dimensionado según GUNICORN_THREADS, para workers
+  con varios hilos (gunicorn --threads N).
+- pgbouncer: sin pool en la aplicación (NullPool); las conexiones las
+  reutiliza PgBouncer en modo transacción. No se usan sentencias preparadas
+  del lado del servidor, que ese modo no admite.
+
+Cada worker de gunicorn tiene su propio pool: el máximo de conexiones a la base
+de datos es workers × (pool_size + max_overflow).
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+PROFILES = ('default', 'gunicorn-threads', 'pgbouncer')
+
+# Últimas esperas de checkout usadas para los percentiles
+LATENCY_SAMPLES = 1000
+
+
+class PoolStats:
+    """Contadores de checkout del pool del proceso actual."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.waits = 0
+            self.timeouts = 0
+            self.overflow_checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self._samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, elapsed, waited, overflowed):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+            self._samples.append(elapsed)
+            if waited:
+                self.waits += 1
+            if overflowed:
+                self.overflow_checkouts += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            checkouts = self.checkouts
+
+            def percentile(p):
+                if not samples:
+                    return 0.0
+                return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3)
+
+            return {
+                'checkouts': checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'overflow_checkouts': self.overflow_checkouts,
+                'checkout_ms': {
+                    'avg': round(self.total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                    'p50': percentile(0.50),
+                    'p95': percentile(0.95),
+                    'p99': percentile(0.99),
+                    'max': round(self.max_wait * 1000, 3),
+                },
+            }
+
+
+stats = PoolStats()
+
+
+def _timed_get(do_get):
+    start = time.perf_counter()
+    try:
+        connection = do_get()
+    except PoolTimeoutError:
+        stats.record_timeout()
+        raise
+    return connection, time.perf_counter() - start
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool que mide cuánto tarda cada checkout, incluida la espera por una conexión libre."""
+
+    def _do_get(self):
+        # Sin conexiones libres y con el desborde al máximo, el checkout espera
+        waited = self.checkedin() == 0 and -1 < self._max_overflow <= self._overflow
+        overflow_before = self._overflow
+        connection, elapsed = _timed_get(super()._do_get)
+        # _overflow es negativo mientras no se llena pool_size
+        overflowed = self._overflow > max(overflow_before, 0)
+        stats.record(elapsed, waited=waited, overflowed=overflowed)
+        return connection
+
+
+class MeteredNullPool(NullPool):
+    """NullPool que mide el tiempo de apertura de cada conexión (con PgBouncer, la espera en su cola)."""
+
+    def _do_get(self):
+        connection, elapsed = _timed_get(super()._do_get)
+        stats.record(elapsed, waited=False, overflowed=False)
+        return connection
+
+
+def engine_options(profile, database_uri, threads=1, pool_size=None, max_overflow=None,
+                   pool_timeout=30, pool_recycle=300):
+    """SQLALCHEMY_ENGINE_OPTIONS del perfil indicado."""
+    if profile not in PROFILES:
+        raise ValueError(f"DB_POOL_PROFILE desconocido: {profile} (opciones: {', '.join(PROFILES)})")
+    if not database_uri.startswith('postgresql'):
+        # SQLite de desarrollo: el pool por defecto de SQLAlchemy es el adecuado
+        return {}
+
+    if profile == 'pgbouncer':
+        options = {'poolclass': MeteredNullPool}
+        # psycopg2 no prepara sentencias; psycopg 3 sí a partir de la quinta ejecución
+        if database_uri.startswith('postgresql+psycopg:'):
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    if profile == 'gunicorn-threads':
+        # Una conexión por hilo y el mismo número de reserva para ráfagas
+        default_size, default_overflow = max(threads, 1), max(threads, 1)
+    else:
+        default_size, default_overflow = 5, 5
+    return {
+        'poolclass': MeteredQueuePool,
+        'pool_size': pool_size if pool_size is not None else default_size,
+        'max_overflow': max_overflow if max_overflow is not None else default_overflow,
+        'pool_timeout': pool_timeout,
+        # Render cierra conexiones inactivas: se comprueban antes de usarlas y se renuevan
+        'pool_pre_ping': True,
+        'pool_recycle': pool_recycle,
+    }
+
+
+def pool_status(engine):
+    """Estado actual del pool y contadores acumulados del proceso."""
+    pool = engine.pool
+    status = {'pid': os.getpid(), 'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+        })
+    status.update(stats.snapshot())
+    return status
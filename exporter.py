@@ -0,0 +1,92 @@
+"""
+Exportación de equipos a CSV o XLSX.
+
+Las filas se leen con proyección de columnas (sin objetos del ORM) y
+yield_per, que en PostgreSQL usa un cursor del lado del servidor: la memoria
+usada no depende del número de equipos. El CSV se envía mientras se lee la
+consulta; el XLSX se escribe en modo write_only a un archivo temporal y luego
+se envía, porque el formato zip necesita el archivo completo.
+
+Los encabezados son los mismos que acepta la importación (importer.py).
+"""
+import csv
+import io
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import literal_column
+from sqlalchemy.orm import aliased
+
+from models import db, Department, Area, Personnel, Equipment
+
+YIELD_PER = 1000
+
+HEADERS = ['Código', 'Serial', 'Tipo', 'Marca', 'Modelo', 'Estatus', 'Departamento', 'Biblioteca',
+           'Asignado a', 'IP', 'MAC', 'Especificaciones', 'Fecha de registro', 'Fecha de compra',
+           'Vencimiento de garantía', 'Notas']
+
+
+def export_query(filters=()):
+    """Consulta de las columnas exportadas, con los mismos filtros y orden del listado."""
+    assigned = aliased(Personnel)
+    assigned_name = (assigned.name + literal_column("' '") + assigned.last_name).label('assigned_to')
+    query = (db.session.query(
+                Equipment.code, Equipment.serial, Equipment.equipment_type, Equipment.brand,
+                Equipment.model, Equipment.status, Department.name.label('department'),
+                Area.name.label('area'), assigned_name, Equipment.ip_address,
+                Equipment.physical_address, Equipment.specifications, Equipment.registration_date,
+                Equipment.purchase_date, Equipment.warranty_expiry, Equipment.notes)
+             .join(Department, Department.id == Equipment.department_id)
+             .outerjoin(Area, Area.id == Equipment.area_id)
+             .outerjoin(assigned, assigned.id == Equipment.assigned_to_id))
+    for condition in filters:
+        query = query.filter(condition)
+    return (query.order_by(Equipment.created_at.desc(), Equipment.id.desc())
+            .yield_per(YIELD_PER))
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def iter_csv(query):
+    """Genera el CSV por bloques de YIELD_PER filas."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel abra el archivo como UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(HEADERS)
+    for count, row in enumerate(query, start=1):
+        writer.writerow([_cell(value) for value in row])
+        if count % YIELD_PER == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(query):
+    """Escribe el XLSX en un archivo temporal y lo devuelve posicionado al inicio."""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Equipos')
+    sheet.append(HEADERS)
+    for row in query:
+        sheet.append([value.date() if isinstance(value, datetime) else value for value in row])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def iter_file(fileobj, chunk_size=64 * 1024):
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
@@ -1,9 +1,16 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, DateField
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, DateField, HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional
 from datetime import datetime
-from models import Department, Personnel, Area, Equipment
+from lookups import department_choices, area_choices, equipment_choice, personnel_choice
+
+# Valores permitidos para equipos (también los usa la importación masiva)
+EQUIPMENT_TYPES = ['Laptop', 'Desktop', 'Monitor', 'Impresora', 'Tablet', 'Servidor', 'Router', 'Switch',
+                   'Disco Duro', 'Memoria RAM', 'Procesador', 'Tarjeta Gráfica', 'Tarjeta Madre',
+                   'Tarjeta de Red', 'Tarjeta de Sonido', 'Tarjeta de Video', 'Teclado', 'Mouse',
+                   'Audífonos', 'Regulador', 'Otro']
+EQUIPMENT_STATUSES = ['Disponible', 'Asignado', 'Mantenimiento', 'Baja']
 
 class LoginForm(FlaskForm):
     username = StringField('Usuario', validators=[DataRequired()])
@@ -32,22 +39,12 @@ class EquipmentForm(FlaskForm):
     code = StringField('Código', validators=[DataRequired(), Length(max=50)])
     serial = StringField('Serial', validators=[DataRequired(), Length(max=100)])
     equipment_type = SelectField('Tipo de Equipo', 
-                                choices=[('Laptop', 'Laptop'), ('Desktop', 'Desktop'), 
-                                        ('Monitor', 'Monitor'), ('Impresora', 'Impresora'),
-                                        ('Tablet', 'Tablet'), ('Servidor', 'Servidor'),
-                                        ('Router', 'Router'), ('Switch', 'Switch'),
-                                        ('Disco Duro', 'Disco Duro'), ('Memoria RAM', 'Memoria RAM'),
-                                        ('Procesador', 'Procesador'), ('Tarjeta Gráfica', 'Tarjeta Gráfica'),
-                                        ('Tarjeta Madre', 'Tarjeta Madre'), ('Tarjeta de Red', 'Tarjeta de Red'),
-                                        ('Tarjeta de Sonido', 'Tarjeta de Sonido'), ('Tarjeta de Video', 'Tarjeta de Video'),
-                                        ('Teclado', 'Teclado'), ('Mouse', 'Mouse'), ('Audífonos', 'Audífonos'),('Regulador','Regulador'),
-                                        ('Otro', 'Otro')],
+                                choices=[(t, t) for t in EQUIPMENT_TYPES],
                                 validators=[DataRequired()])
     brand = StringField('Marca', validators=[Optional(), Length(max=100)])
     model = StringField('Modelo', validators=[Optional(), Length(max=100)])
     status = SelectField('Estatus', 
-                        choices=[('Disponible', 'Disponible'), ('Asignado', 'Asignado'),
-                                ('Mantenimiento', 'Mantenimiento'), ('Baja', 'Baja')],
+                        choices=[(s, s) for s in EQUIPMENT_STATUSES],
                         validators=[DataRequired()])
     department_id = SelectField('Departamento', coerce=int, validators=[DataRequired()])
     area_id = SelectField('Biblioteca', coerce=lambda x: int(x) if x else None, validators=[Optional()])
@@ -63,20 +60,17 @@ class EquipmentForm(FlaskForm):
     purchase_date = DateField('Fecha de Compra', validators=[Optional()])
     warranty_expiry = DateField('Vencimiento de Garantía', validators=[Optional()])
     notes = TextAreaField('Notas', validators=[Optional()])
+    # Versión del equipo al abrir el formulario (ver concurrency.py)
+    version_id = HiddenField()
     submit = SubmitField('Guardar')
     
     def __init__(self, *args, **kwargs):
         super(EquipmentForm, self).__init__(*args, **kwargs)
-        from models import db
-        departments = Department.query.order_by(Department.name).all()
-        self.department_id.choices = [(d.id, d.name) for d in departments] if departments else []
-        
-        areas = Area.query.order_by(Area.name).all()
-        self.area_id.choices = [('', 'Ninguna')] + [(a.id, a.name) for a in areas] if areas else [('', 'Ninguna')]
-        
-        personnel = Personnel.query.order_by(Personnel.name).all()
-        self.assigned_to_id.choices = [('', 'Ninguno')] + [(p.id, f'{p.name} {p.last_name}') 
-                                                           for p in personnel] if personnel else [('', 'Ninguno')]
+        # Opciones desde la caché de listas (ver lookups.py)
+        self.department_id.choices = department_choices()
+        self.area_id.choices = [('', 'Ninguna')] + area_choices()
+        # Personal con búsqueda remota: solo se incluye la opción seleccionada
+        self.assigned_to_id.choices = [('', 'Ninguno')] + personnel_choice(self.assigned_to_id.data)
 
 class PersonnelForm(FlaskForm):
     name = StringField('Nombre', validators=[DataRequired(), Length(max=100)])
@@ -91,12 +85,8 @@ class PersonnelForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(PersonnelForm, self).__init__(*args, **kwargs)
-        from models import db
-        departments = Department.query.order_by(Department.name).all()
-        self.department_id.choices = [(d.id, d.name) for d in departments] if departments else []
-        
-        areas = Area.query.order_by(Area.name).all()
-        self.area_id.choices = [('', 'Ninguna')] + [(a.id, a.name) for a in areas] if areas else [('', 'Ninguna')]
+        self.department_id.choices = department_choices()
+        self.area_id.choices = [('', 'Ninguna')] + area_choices()
 
 class AssignmentForm(FlaskForm):
     equipment_id = SelectField('Equipo', coerce=int, validators=[DataRequired()])
@@ -107,16 +97,17 @@ class AssignmentForm(FlaskForm):
                         choices=[('Activa', 'Activa'), ('Devuelta', 'Devuelta'), ('Cancelada', 'Cancelada')],
                         validators=[DataRequired()])
     notes = TextAreaField('Notas', validators=[Optional()])
+    # Versión de la asignación al abrir el formulario (ver concurrency.py)
+    version_id = HiddenField()
     submit = SubmitField('Guardar')
     
     def __init__(self, *args, **kwargs):
         super(AssignmentForm, self).__init__(*args, **kwargs)
-        from models import db
-        # Solo mostrar equipos disponibles o asignados
-        equipments = Equipment.query.filter(Equipment.status.in_(['Disponible', 'Asignado'])).order_by(Equipment.code).all()
-        self.equipment_id.choices = [(e.id, f'{e.code} - {e.equipment_type} ({e.brand or ""} {e.model or ""})') 
-                                     for e in equipments] if equipments else []
-        
-        personnel = Personnel.query.order_by(Personnel.name).all()
-        self.personnel_id.choices = [(p.id, f'{p.name} {p.last_name} - {p.department.name}') 
-                                    for p in personnel] if personnel else []
+        # Selectores con búsqueda remota (/api/equipment/search, /api/personnel/search):
+        # solo se incluye la opción seleccionada. Equipos disponibles o asignados.
+        self.equipment_id.choices = equipment_choice(self.equipment_id.data, assignable_only=True)
+        self.personnel_id.choices = personnel_choice(self.personnel_id.data, with_department=True)
+
+class EquipmentImportForm(FlaskForm):
+    file = FileField('Archivo', validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'Solo archivos CSV o XLSX')])
+    submit = SubmitField('Importar')
@@ -0,0 +1,65 @@
+"""
+Caché de filas ya renderizadas para los listados de equipos y asignaciones.
+
+Cada fila (_equipment_row.html, _assignment_row.html) se guarda como HTML bajo
+una llave con el id y el updated_at de la fila más los datos que muestra de sus
+relaciones (nombre del departamento, biblioteca, persona...). Editar la fila o
+renombrar algo relacionado produce otra llave, así que no hace falta invalidar
+nada y la entrada vieja sale por LRU. La misma fila se reutiliza en todas las
+páginas y filtros del listado; renderizar una página ya vista es casi solo
+concatenar cadenas.
+
+Las filas con foto incluyen la ventana de IMAGE_URL_TTL en la llave, porque su
+URL firmada cambia con ella. La caché es por proceso (LocalCache): un despliegue
+reinicia los workers y descarta las filas hechas con plantillas anteriores.
+"""
+import time
+
+from flask import current_app
+from markupsafe import Markup
+
+from cache import LocalCache
+
+_rows = LocalCache(5000)
+
+
+def init_app(app):
+    global _rows
+    _rows = LocalCache(app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+
+
+def _image_window(filename):
+    if not filename:
+        return None
+    return int(time.time()) // current_app.config['IMAGE_URL_TTL']
+
+
+def _person(personnel):
+    return (personnel.id, personnel.name, personnel.last_name) if personnel else None
+
+
+def _equipment_related(eq):
+    return (eq.department.name, eq.area.name if eq.area else None,
+            _person(eq.assigned_personnel), _image_window(eq.image_filename))
+
+
+def _assignment_related(assignment):
+    return (assignment.equipment.id, assignment.equipment.updated_at,
+            _person(assignment.personnel), assignment.personnel.department.name)
+
+
+# Tipo de fila: (plantilla, variable de la plantilla, datos de relaciones que muestra)
+ROWS = {
+    'equipment': ('_equipment_row.html', 'eq', _equipment_related),
+    'assignment': ('_assignment_row.html', 'assignment', _assignment_related),
+}
+
+
+def render_row(kind, obj):
+    template_name, name, related = ROWS[kind]
+    key = (kind, obj.id, obj.updated_at, related(obj))
+    html = _rows.get(key)
+    if html is None:
+        html = Markup(current_app.jinja_env.get_template(template_name).render({name: obj}))
+        _rows.set(key, html)
+    return html
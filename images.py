@@ -0,0 +1,94 @@
+"""
+Miniaturas de las fotos de equipos.
+
+Cada foto subida se guarda tal cual y un pool de hilos genera en segundo plano
+dos versiones WebP de tamaño fijo:
+
+- thumb: 96×96 recortada, para la tabla de equipos (se muestra a 50px, 2x
+  para pantallas de alta densidad).
+- preview: hasta 800×800 sin recortar, para la ficha del equipo.
+
+Se guardan en UPLOAD_FOLDER/<variante>/<nombre original>.webp. Si una versión
+aún no existe (el hilo no terminó, el proceso se reinició o la foto es
+anterior a este cambio) se genera al pedirla. `flask images-backfill` genera
+las que falten para todas las fotos.
+"""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+VARIANTS = {
+    'thumb': {'size': (96, 96), 'crop': True, 'quality': 75},
+    'preview': {'size': (800, 800), 'crop': False, 'quality': 80},
+}
+
+_executor = None
+
+
+def init_app(app):
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=app.config.get('IMAGE_WORKERS', 2),
+                                   thread_name_prefix='images')
+
+
+def variant_path(upload_folder, variant, filename):
+    return os.path.join(upload_folder, variant, f'{filename}.webp')
+
+
+def _save_variant(image, path, size, crop, quality):
+    if crop:
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Escritura atómica: otro hilo o worker nunca sirve un archivo a medias
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            resized.save(output, 'WEBP', quality=quality, method=4)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def generate_variants(upload_folder, filename, variants=None):
+    """Genera las versiones que falten de una foto. Devuelve las creadas."""
+    source = os.path.join(upload_folder, filename)
+    pending = [name for name in (variants or VARIANTS)
+               if not os.path.exists(variant_path(upload_folder, name, filename))]
+    if not pending or not os.path.exists(source):
+        return []
+    with Image.open(source) as image:
+        # JPEG puede decodificarse directamente a menor resolución
+        image.draft('RGB', max(VARIANTS[name]['size'] for name in pending))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for name in pending:
+            _save_variant(image, variant_path(upload_folder, name, filename), **VARIANTS[name])
+    return pending
+
+
+def submit_variants(upload_folder, filename):
+    """Encola la generación de las versiones de una foto recién subida."""
+    if _executor is None:
+        return generate_variants(upload_folder, filename)
+    future = _executor.submit(generate_variants, upload_folder, filename)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        print(f"No se pudieron generar las miniaturas: {error}")
+
+
+def delete_variants(upload_folder, filename):
+    for name in VARIANTS:
+        path = variant_path(upload_folder, name, filename)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,299 @@
+"""
+Importación masiva de equipos desde CSV o XLSX.
+
+El archivo se lee fila por fila (nunca completo en memoria). Los nombres de
+departamento, biblioteca y personal se resuelven con diccionarios cargados una
+sola vez, la unicidad de código y serial se comprueba por lotes contra la base
+de datos y dentro del propio archivo, y las filas válidas se insertan en lotes:
+COPY en PostgreSQL, executemany en los demás motores.
+
+Las filas rechazadas se escriben en un reporte CSV con el número de fila y el
+motivo.
+"""
+import csv
+import io
+import unicodedata
+from datetime import datetime, date
+
+from sqlalchemy.exc import IntegrityError
+
+import cache
+import conditional
+from forms import EQUIPMENT_TYPES, EQUIPMENT_STATUSES
+from models import db, Department, Area, Personnel, Equipment
+
+BATCH_SIZE = 2000
+
+# Columnas que se insertan, en el orden usado por COPY
+COLUMNS = ['code', 'serial', 'equipment_type', 'brand', 'model', 'status', 'department_id', 'area_id',
+           'assigned_to_id', 'ip_address', 'physical_address', 'specifications', 'registration_date',
+           'purchase_date', 'warranty_expiry', 'notes', 'created_at', 'updated_at']
+
+# Encabezados aceptados (sin acentos y en minúsculas) -> campo
+HEADER_ALIASES = {
+    'codigo': 'code', 'code': 'code',
+    'serial': 'serial',
+    'tipo': 'equipment_type', 'tipo de equipo': 'equipment_type', 'equipment_type': 'equipment_type',
+    'marca': 'brand', 'brand': 'brand',
+    'modelo': 'model', 'model': 'model',
+    'estatus': 'status', 'estado': 'status', 'status': 'status',
+    'departamento': 'department', 'department': 'department',
+    'biblioteca': 'area', 'area': 'area',
+    'asignado a': 'assigned_to', 'asignado': 'assigned_to', 'assigned_to': 'assigned_to',
+    'ip': 'ip_address', 'direccion ip': 'ip_address', 'ip_address': 'ip_address',
+    'mac': 'physical_address', 'direccion fisica (mac)': 'physical_address', 'physical_address': 'physical_address',
+    'especificaciones': 'specifications', 'especificaciones tecnicas': 'specifications',
+    'specifications': 'specifications',
+    'fecha de registro': 'registration_date', 'fecha registro': 'registration_date',
+    'registration_date': 'registration_date',
+    'fecha de compra': 'purchase_date', 'purchase_date': 'purchase_date',
+    'vencimiento de garantia': 'warranty_expiry', 'garantia': 'warranty_expiry',
+    'warranty_expiry': 'warranty_expiry',
+    'notas': 'notes', 'notes': 'notes',
+}
+
+MAX_LENGTHS = {'code': 50, 'serial': 100, 'brand': 100, 'model': 100, 'ip_address': 45, 'physical_address': 50}
+
+REPORT_HEADER = ['fila', 'codigo', 'serial', 'error']
+
+
+class ImportResult:
+    def __init__(self):
+        self.total = 0
+        self.inserted = 0
+        self.errors = 0
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(text.lower().split())
+
+
+def iter_rows(fileobj, filename):
+    """Genera (número de fila, {campo: valor}) leyendo el archivo de forma incremental."""
+    if filename.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None) or []
+            fields = [HEADER_ALIASES.get(_normalize(name)) for name in header]
+            for line, values in enumerate(rows, start=2):
+                if values is None or all(value in (None, '') for value in values):
+                    continue
+                yield line, {field: value for field, value in zip(fields, values) if field}
+        finally:
+            workbook.close()
+        return
+
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text, dialect)
+    header = next(reader, None) or []
+    fields = [HEADER_ALIASES.get(_normalize(name)) for name in header]
+    for line, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        yield line, {field: value for field, value in zip(fields, values) if field}
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _date(value, field):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    value = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f'Fecha inválida en {field}: {value}')
+
+
+class _Lookups:
+    """Diccionarios nombre -> id cargados una vez por importación."""
+
+    def __init__(self):
+        self.departments = {_normalize(name): id for id, name in db.session.query(Department.id, Department.name)}
+        self.areas = {_normalize(name): id for id, name in db.session.query(Area.id, Area.name)}
+        self.personnel = {}
+        for id, name, last_name, employee_id in db.session.query(
+                Personnel.id, Personnel.name, Personnel.last_name, Personnel.employee_id):
+            self.personnel.setdefault(_normalize(f'{name} {last_name}'), id)
+            if employee_id:
+                self.personnel[_normalize(employee_id)] = id
+        self.types = {_normalize(t): t for t in EQUIPMENT_TYPES}
+        self.statuses = {_normalize(s): s for s in EQUIPMENT_STATUSES}
+
+
+def _build_row(raw, lookups, now):
+    """Convierte una fila del archivo en los valores a insertar o lanza ValueError."""
+    row = {field: _text(raw.get(field)) for field in
+           ('code', 'serial', 'brand', 'model', 'ip_address', 'physical_address', 'specifications', 'notes')}
+    if not row['code']:
+        raise ValueError('El código es obligatorio')
+    if not row['serial']:
+        raise ValueError('El serial es obligatorio')
+    for field, max_length in MAX_LENGTHS.items():
+        if row[field] and len(row[field]) > max_length:
+            raise ValueError(f'{field} supera los {max_length} caracteres')
+
+    equipment_type = lookups.types.get(_normalize(raw.get('equipment_type')))
+    if not equipment_type:
+        raise ValueError(f"Tipo de equipo inválido: {raw.get('equipment_type') or '(vacío)'}")
+    row['equipment_type'] = equipment_type
+
+    status = _text(raw.get('status'))
+    row['status'] = lookups.statuses.get(_normalize(status)) if status else 'Disponible'
+    if not row['status']:
+        raise ValueError(f'Estatus inválido: {status}')
+
+    department = _text(raw.get('department'))
+    row['department_id'] = lookups.departments.get(_normalize(department))
+    if not row['department_id']:
+        raise ValueError(f"Departamento no encontrado: {department or '(vacío)'}")
+
+    area = _text(raw.get('area'))
+    row['area_id'] = lookups.areas.get(_normalize(area)) if area else None
+    if area and not row['area_id']:
+        raise ValueError(f'Biblioteca no encontrada: {area}')
+
+    assigned_to = _text(raw.get('assigned_to'))
+    row['assigned_to_id'] = lookups.personnel.get(_normalize(assigned_to)) if assigned_to else None
+    if assigned_to and not row['assigned_to_id']:
+        raise ValueError(f'Personal no encontrado: {assigned_to}')
+
+    row['registration_date'] = _date(raw.get('registration_date'), 'fecha de registro') or now
+    row['purchase_date'] = _date(raw.get('purchase_date'), 'fecha de compra')
+    row['warranty_expiry'] = _date(raw.get('warranty_expiry'), 'vencimiento de garantía')
+    row['created_at'] = now
+    row['updated_at'] = now
+    return row
+
+
+def _copy_rows(rows):
+    # COPY dentro de la misma transacción de la sesión
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column].isoformat() if isinstance(row[column], datetime) else row[column]
+                         for column in COLUMNS])
+    buffer.seek(0)
+    statement = f"COPY equipment ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    connection = db.session.connection()
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except connection.dialect.dbapi.IntegrityError as e:
+        # El cursor crudo no pasa por SQLAlchemy: se envuelve el error del driver
+        # (UniqueViolation de psycopg2) para que _flush_batch lo reintente fila por fila
+        raise IntegrityError(statement, None, e) from e
+    finally:
+        cursor.close()
+
+
+def _insert_rows(rows):
+    if db.engine.dialect.name == 'postgresql':
+        _copy_rows(rows)
+        # COPY no pasa por la sesión: los ETag de los listados dependen de equipment
+        conditional.mark_changed(db.session, 'equipment')
+    else:
+        db.session.execute(db.insert(Equipment), rows)
+
+
+def _flush_batch(batch, report, result):
+    """Valida el lote contra la base de datos, lo inserta y hace commit."""
+    codes = [row['code'] for _, row in batch]
+    serials = [row['serial'] for _, row in batch]
+    existing_codes = {code for (code,) in db.session.query(Equipment.code).filter(Equipment.code.in_(codes))}
+    existing_serials = {serial for (serial,) in
+                        db.session.query(Equipment.serial).filter(Equipment.serial.in_(serials))}
+
+    valid = []
+    for line, row in batch:
+        if row['code'] in existing_codes:
+            report.writerow([line, row['code'], row['serial'], 'El código ya existe'])
+            result.errors += 1
+        elif row['serial'] in existing_serials:
+            report.writerow([line, row['code'], row['serial'], 'El serial ya existe'])
+            result.errors += 1
+        else:
+            valid.append((line, row))
+    if not valid:
+        return
+
+    try:
+        _insert_rows([row for _, row in valid])
+        db.session.commit()
+        result.inserted += len(valid)
+    except IntegrityError:
+        # Otro proceso insertó el mismo código o serial entre la validación y el
+        # insert: se reintenta fila por fila para reportar solo las que chocan
+        db.session.rollback()
+        for line, row in valid:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(Equipment), [row])
+                result.inserted += 1
+            except IntegrityError as e:
+                report.writerow([line, row['code'], row['serial'], f'Violación de unicidad: {e.orig}'])
+                result.errors += 1
+        db.session.commit()
+
+
+def import_equipment(fileobj, filename, report_file, batch_size=BATCH_SIZE):
+    """
+    Importa equipos desde `fileobj` (CSV o XLSX según `filename`).
+
+    Escribe las filas rechazadas en `report_file` (texto CSV) y devuelve un
+    ImportResult con los totales.
+    """
+    result = ImportResult()
+    report = csv.writer(report_file)
+    report.writerow(REPORT_HEADER)
+    lookups = _Lookups()
+    seen_codes, seen_serials = set(), set()
+    now = datetime.utcnow()
+    batch = []
+
+    try:
+        for line, raw in iter_rows(fileobj, filename):
+            result.total += 1
+            try:
+                row = _build_row(raw, lookups, now)
+                if row['code'] in seen_codes:
+                    raise ValueError('Código duplicado en el archivo')
+                if row['serial'] in seen_serials:
+                    raise ValueError('Serial duplicado en el archivo')
+            except ValueError as e:
+                report.writerow([line, _text(raw.get('code')) or '', _text(raw.get('serial')) or '', str(e)])
+                result.errors += 1
+                continue
+            seen_codes.add(row['code'])
+            seen_serials.add(row['serial'])
+            batch.append((line, row))
+            if len(batch) >= batch_size:
+                _flush_batch(batch, report, result)
+                batch = []
+        if batch:
+            _flush_batch(batch, report, result)
+    finally:
+        # COPY no pasa por el ORM: invalidar las cachés que dependen de equipment
+        if result.inserted:
+            cache.bump_tables('equipment')
+    return result
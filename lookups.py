@@ -0,0 +1,86 @@
+"""
+Listas de opciones para formularios y filtros, cacheadas por versión de tabla.
+
+Cada lista se reconstruye solo cuando cambia alguna de las tablas de las que
+depende (ver cache.py), así abrir o reenviar un formulario no vuelve a leer
+todos los departamentos y bibliotecas. Equipos y personal, que pueden ser
+miles, usan selectores con búsqueda remota y solo resuelven la opción elegida.
+
+Con el LRU local los contadores de cache.py son de cada worker: un departamento
+creado en otro worker no aparecería hasta que expire el TTL y WTForms
+rechazaría su id ("Not a valid choice"). Por eso las listas también se comparan
+con los contadores de table_version (ver conditional.py), que están en la base
+de datos y son los mismos para todos; se leen en una sola consulta por petición.
+"""
+from flask import current_app, g
+
+import cache
+from conditional import table_versions
+from models import db, Department, Area, Personnel, Equipment
+
+LOOKUP_TABLES = ('department', 'area', 'equipment')
+
+
+def _ttl():
+    return current_app.config.get('LOOKUP_CACHE_TTL')
+
+
+def _shared_versions(table):
+    """Contador de `table` en table_version; () sin las filas (base sin init-db)."""
+    if 'lookup_versions' not in g:
+        versions = table_versions(list(LOOKUP_TABLES))
+        g.lookup_versions = dict(zip(LOOKUP_TABLES, versions)) if versions is not None else {}
+    return (g.lookup_versions[table],) if table in g.lookup_versions else ()
+
+
+def department_choices():
+    return cache.memoize('lookup:departments', ['department'], lambda: [
+        (row.id, row.name)
+        for row in db.session.query(Department.id, Department.name).order_by(Department.name)
+    ], ttl=_ttl(), shared_versions=_shared_versions('department'))
+
+
+def area_choices():
+    return cache.memoize('lookup:areas', ['area'], lambda: [
+        (row.id, row.name)
+        for row in db.session.query(Area.id, Area.name).order_by(Area.name)
+    ], ttl=_ttl(), shared_versions=_shared_versions('area'))
+
+
+def equipment_choice(equipment_id, assignable_only=False):
+    """
+    Opción del equipo seleccionado para un selector con búsqueda remota.
+
+    El selector solo contiene la opción elegida, así que la validación de
+    WTForms rechaza ids inexistentes (o no asignables) sin cargar la lista.
+    """
+    if not equipment_id:
+        return []
+    query = (db.session.query(Equipment.id, Equipment.code, Equipment.equipment_type,
+                              Equipment.brand, Equipment.model)
+             .filter(Equipment.id == equipment_id))
+    if assignable_only:
+        query = query.filter(Equipment.status.in_(['Disponible', 'Asignado']))
+    return [(row.id, f'{row.code} - {row.equipment_type} ({row.brand or ""} {row.model or ""})')
+            for row in query]
+
+
+def personnel_choice(personnel_id, with_department=False):
+    """Opción de la persona seleccionada para un selector con búsqueda remota."""
+    if not personnel_id:
+        return []
+    row = (db.session.query(Personnel.id, Personnel.name, Personnel.last_name,
+                            Department.name.label('department'))
+           .join(Department, Department.id == Personnel.department_id)
+           .filter(Personnel.id == personnel_id)
+           .first())
+    if row is None:
+        return []
+    label = f'{row.name} {row.last_name}'
+    return [(row.id, f'{label} - {row.department}' if with_department else label)]
+
+
+def equipment_types():
+    return cache.memoize('lookup:equipment_types', ['equipment'], lambda: sorted(
+        row[0] for row in db.session.query(Equipment.equipment_type).distinct()
+    ), ttl=_ttl(), shared_versions=_shared_versions('equipment'))
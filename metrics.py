@@ -0,0 +1,188 @@
+"""
+Métricas por petición: consultas SQL, tiempo de plantillas y tiempo total.
+
+Por cada petición se cuentan las sentencias SQL y su duración (eventos de
+SQLAlchemy sobre todos los engines), el tiempo de render_template() y el tiempo
+total del handler. Se devuelven en la cabecera Server-Timing (visible en la
+pestaña de red del navegador; se desactiva con SERVER_TIMING=0) y se acumulan en histogramas por endpoint que
+/metrics expone en el formato de texto de Prometheus.
+
+Los histogramas se guardan en el proceso; si se define CACHE_REDIS_URL se
+guardan en Redis y /metrics devuelve la suma de todos los workers de gunicorn,
+con cualquier worker que atienda la consulta.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Límites superiores (le) de cada histograma, en segundos o en número de consultas
+HISTOGRAMS = {
+    'request_duration_seconds': ('Tiempo total del handler por endpoint',
+                                 (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'request_sql_queries': ('Sentencias SQL por petición',
+                            (1, 2, 5, 10, 20, 50, 100, 200, 500)),
+    'request_sql_duration_seconds': ('Tiempo en la base de datos por petición',
+                                     (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)),
+    'request_template_duration_seconds': ('Tiempo de render de plantillas por petición',
+                                          (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)),
+}
+PREFIX = 'inventario_'
+
+
+class LocalMetrics:
+    """Histogramas del proceso actual."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (métrica, endpoint) -> [cuentas por bucket (la última es +Inf), suma, total]
+        self._series = {}
+
+    def observe(self, endpoint, values):
+        with self._lock:
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                series = self._series.setdefault((name, endpoint), [[0] * (len(buckets) + 1), 0.0, 0])
+                series[0][bisect_left(buckets, value)] += 1
+                series[1] += value
+                series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+
+
+class RedisMetrics:
+    """Histogramas en Redis sumados entre workers (requiere el paquete redis)."""
+
+    def __init__(self, url, prefix='inventario:metrics:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_REDIS_URL requiere el paquete redis (pip install redis)')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def observe(self, endpoint, values):
+        pipe = self._client.pipeline(transaction=False)
+        for name, value in values.items():
+            key = self.prefix + name
+            pipe.hincrby(key, f'{endpoint}|{bisect_left(HISTOGRAMS[name][1], value)}', 1)
+            pipe.hincrbyfloat(key, f'{endpoint}|sum', value)
+            pipe.hincrby(key, f'{endpoint}|count', 1)
+        pipe.execute()
+
+    def snapshot(self):
+        series = {}
+        for name, (_, buckets) in HISTOGRAMS.items():
+            for field, raw in self._client.hgetall(self.prefix + name).items():
+                endpoint, slot = field.decode().rsplit('|', 1)
+                entry = series.setdefault((name, endpoint), [[0] * (len(buckets) + 1), 0.0, 0])
+                if slot == 'sum':
+                    entry[1] = float(raw)
+                elif slot == 'count':
+                    entry[2] = int(raw)
+                else:
+                    entry[0][int(slot)] = int(raw)
+        return series
+
+
+_backend = LocalMetrics()
+
+
+def init_app(app):
+    global _backend
+    if app.config.get('CACHE_REDIS_URL'):
+        _backend = RedisMetrics(app.config['CACHE_REDIS_URL'])
+    else:
+        _backend = LocalMetrics()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_finish_render, app)
+
+
+def _current():
+    return g.get('request_metrics') if has_request_context() else None
+
+
+def _start_request():
+    g.request_metrics = {'started': time.perf_counter(), 'queries': 0, 'sql': 0.0, 'query_started': None,
+                         'template': 0.0, 'render_started': None}
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current()
+    if current is not None:
+        current['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current()
+    if current is not None and current['query_started'] is not None:
+        current['queries'] += 1
+        current['sql'] += time.perf_counter() - current['query_started']
+        current['query_started'] = None
+
+
+def _start_render(sender, template, context, **extra):
+    current = _current()
+    if current is not None:
+        current['render_started'] = time.perf_counter()
+
+
+def _finish_render(sender, template, context, **extra):
+    current = _current()
+    if current is not None and current['render_started'] is not None:
+        current['template'] += time.perf_counter() - current['render_started']
+        current['render_started'] = None
+
+
+def _finish_request(response):
+    current = _current()
+    if current is None:
+        return response
+    elapsed = time.perf_counter() - current['started']
+    if current_app.config.get('SERVER_TIMING', True):
+        response.headers['Server-Timing'] = (
+            f'sql;dur={current["sql"] * 1000:.1f};desc="{current["queries"]} consultas", '
+            f'tpl;dur={current["template"] * 1000:.1f}, '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+    _backend.observe(request.endpoint or 'none', {
+        'request_duration_seconds': elapsed,
+        'request_sql_queries': current['queries'],
+        'request_sql_duration_seconds': current['sql'],
+        'request_template_duration_seconds': current['template'],
+    })
+    return response
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """Histogramas en el formato de texto de Prometheus (versión 0.0.4)."""
+    series = _backend.snapshot()
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        metric = PREFIX + name
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (series_name, endpoint), (counts, total, count) in sorted(series.items()):
+            if series_name != name:
+                continue
+            endpoint = _label(endpoint)
+            cumulative = 0
+            for bound, bucket in zip((*buckets, '+Inf'), counts):
+                cumulative += bucket
+                lines.append(f'{metric}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{endpoint="{endpoint}"}} {total}')
+            lines.append(f'{metric}_count{{endpoint="{endpoint}"}} {count}')
+    return '\n'.join(lines) + '\n'
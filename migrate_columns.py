@@ -0,0 +1,85 @@
+"""
+Script para agregar a una base de datos existente las columnas nuevas de models.py
+Ejecutar: python migrate_columns.py
+
+db.create_all() no modifica tablas que ya existen, así que una columna nueva
+se agrega aquí con ALTER TABLE ... ADD COLUMN. Las columnas NOT NULL deben
+declarar server_default: las filas existentes reciben ese valor (en
+PostgreSQL 11+ sin reescribir la tabla).
+
+Las columnas que pasan a NOT NULL se rellenan con la expresión de
+NOT_NULL_BACKFILLS y luego se marcan NOT NULL. SQLite no cambia la nulabilidad
+de una columna sin reconstruir la tabla: ahí solo se rellenan las filas.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from models import db
+
+# (tabla, columna) -> expresión SQL para las filas con NULL
+NOT_NULL_BACKFILLS = {
+    # El listado de equipos pagina por (created_at, id)
+    ('equipment', 'created_at'): 'COALESCE(registration_date, updated_at, CURRENT_TIMESTAMP)',
+}
+
+
+def add_missing_columns(engine):
+    """Agrega las columnas declaradas que falten en tablas existentes. Devuelve 'tabla.columna'."""
+    added = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        preparer = conn.dialect.identifier_preparer
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f'{table.name}.{column.name} es NOT NULL y no tiene server_default')
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                print(f"  - {table.name}.{column.name}")
+                conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def backfill_not_null(engine):
+    """Rellena y marca NOT NULL las columnas de NOT_NULL_BACKFILLS. Devuelve 'tabla.columna'."""
+    changed = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        preparer = conn.dialect.identifier_preparer
+        for (table_name, column_name), expression in NOT_NULL_BACKFILLS.items():
+            if not inspector.has_table(table_name):
+                continue
+            columns = {column['name']: column for column in inspector.get_columns(table_name)}
+            if column_name not in columns or not columns[column_name]['nullable']:
+                continue
+            table, column = preparer.quote(table_name), preparer.quote(column_name)
+            filled = conn.execute(text(f'UPDATE {table} SET {column} = {expression} '
+                                       f'WHERE {column} IS NULL')).rowcount
+            if filled and inspector.has_table('table_version'):
+                # Cambia el orden de los listados: invalida sus ETag (ver conditional.py)
+                conn.execute(text("UPDATE table_version SET version = version + 1 WHERE name = :name"),
+                             {'name': table_name})
+            if conn.dialect.name == 'sqlite':
+                if filled:
+                    print(f"  - {table_name}.{column_name}: {filled} filas rellenadas")
+                    changed.append(f'{table_name}.{column_name}')
+                continue
+            print(f"  - {table_name}.{column_name}: {filled} filas rellenadas, NOT NULL")
+            conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL'))
+            changed.append(f'{table_name}.{column_name}')
+    return changed
+
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        print(f"Agregando columnas en {db.engine.url.render_as_string(hide_password=True)}...")
+        added = add_missing_columns(db.engine)
+        print(f"✓ {len(added)} columnas agregadas" if added else "✓ Todas las columnas ya existían")
+        changed = backfill_not_null(db.engine)
+        print(f"✓ {len(changed)} columnas rellenadas" if changed else "✓ No hay columnas NULL que rellenar")
@@ -0,0 +1,107 @@
+"""
+Script para crear en una base de datos existente los índices declarados en models.py
+Ejecutar: python migrate_indexes.py
+
+db.create_all() solo crea índices al crear una tabla nueva, así que las bases
+ya existentes necesitan este paso. En PostgreSQL los índices se crean con
+CREATE INDEX CONCURRENTLY para no bloquear escrituras mientras se construyen.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from models import db, ACTIVE_ASSIGNMENT_INDEX
+
+
+def _invalid_postgres_indexes(conn):
+    # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice marcado como inválido
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid
+    """))
+    return {row[0] for row in rows}
+
+
+def _existing_indexes(conn):
+    # Consulta directa al catálogo: el inspector no refleja índices sobre expresiones
+    if conn.dialect.name == 'postgresql':
+        rows = conn.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"))
+    elif conn.dialect.name == 'sqlite':
+        rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))
+    else:
+        inspector = inspect(conn)
+        return {index['name'] for table in inspector.get_table_names()
+                for index in inspector.get_indexes(table)}
+    return {row[0] for row in rows}
+
+
+def cancel_duplicate_active_assignments(conn):
+    """
+    Deja una sola asignación activa por equipo para poder crear ACTIVE_ASSIGNMENT_INDEX.
+
+    Antes del índice dos workers podían asignar el mismo equipo a la vez. Se
+    conserva la asignación de la persona que figura en el equipo (o la más
+    reciente) y las demás pasan a 'Cancelada'. Devuelve las filas canceladas.
+    """
+    result = conn.execute(text("""
+        UPDATE assignment
+        SET status = 'Cancelada', return_date = COALESCE(return_date, CURRENT_TIMESTAMP),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT a.id, ROW_NUMBER() OVER (
+                    PARTITION BY a.equipment_id
+                    ORDER BY CASE WHEN a.personnel_id = e.assigned_to_id THEN 0 ELSE 1 END, a.id DESC
+                ) AS n
+                FROM assignment a JOIN equipment e ON e.id = a.equipment_id
+                WHERE a.status = 'Activa'
+            ) ranked
+            WHERE n > 1
+        )
+    """))
+    if result.rowcount and inspect(conn).has_table('table_version'):
+        # Invalida los ETag del listado de asignaciones (ver conditional.py)
+        conn.execute(text("UPDATE table_version SET version = version + 1 WHERE name = 'assignment'"))
+    return result.rowcount
+
+
+def create_indexes(engine, concurrently=True):
+    """Crea los índices faltantes de todas las tablas. Devuelve sus nombres."""
+    is_postgres = engine.dialect.name == 'postgresql'
+    created = []
+    # CONCURRENTLY no puede ejecutarse dentro de una transacción
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        inspector = inspect(conn)
+        existing = _existing_indexes(conn)
+        invalid = _invalid_postgres_indexes(conn) if is_postgres else set()
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name in existing and index.name not in invalid:
+                    continue
+                if index.name in invalid:
+                    print(f"  - Reconstruyendo índice inválido {index.name}")
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                if is_postgres and concurrently:
+                    ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1) \
+                             .replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+                if index.name == ACTIVE_ASSIGNMENT_INDEX:
+                    cancelled = cancel_duplicate_active_assignments(conn)
+                    if cancelled:
+                        print(f"  - {cancelled} asignaciones activas duplicadas marcadas como 'Cancelada'")
+                print(f"  - {index.name}")
+                conn.execute(text(ddl))
+                created.append(index.name)
+        if engine.dialect.name in ('postgresql', 'sqlite'):
+            # Estadísticas actualizadas para que el planificador elija los índices nuevos
+            conn.execute(text('ANALYZE'))
+    return created
+
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        print(f"Creando índices en {db.engine.url.render_as_string(hide_password=True)}...")
+        created = create_indexes(db.engine)
+        print(f"✓ {len(created)} índices creados" if created else "✓ Todos los índices ya existían")
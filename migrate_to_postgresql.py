@@ -1,12 +1,50 @@
 """
 Script para migrar datos de SQLite a PostgreSQL
 Ejecutar: python migrate_to_postgresql.py
+
+Opciones:
+    --sqlite PATH          base de datos de origen (por defecto instance/inventario.db)
+    --database-url URL     destino (por defecto la de config.py)
+    --batch-size N         filas por lote (por defecto 5000)
+    --jobs N               tablas cargadas en paralelo (por defecto 3)
+    --restart              ignora el punto de control y empieza de cero
+    --truncate             vacía las tablas del destino antes de empezar (no al reanudar)
+    --verify-only          solo compara conteos y checksums
+
+Las filas se leen en orden de id por lotes y se cargan con COPY (INSERT de
+varias filas en otros motores), con un commit por lote. Las tablas sin
+dependencias entre sí se cargan en paralelo respetando el orden de las llaves
+foráneas. Tras cada lote se guarda el último id copiado en un archivo de
+control: si la migración se interrumpe, al volver a ejecutarla continúa donde
+quedó. Al final se sincronizan las secuencias de ids y se comparan conteos y
+checksums de cada tabla. Los contadores de table_version no se copian (ver
+SKIPPED_TABLES).
+
+El destino se crea con el índice único de asignaciones activas
+(uq_assignment_active_equipment); las bases anteriores a ese índice pueden
+tener dos asignaciones activas del mismo equipo, así que antes de copiar se
+cancelan en el origen las sobrantes, igual que hace migrate_indexes.py. Del
+mismo modo se rellenan en el origen las columnas que el destino crea NOT NULL
+(ver migrate_columns.py).
 """
+import argparse
+import hashlib
+import io
+import json
 import os
 import sqlite3
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import DateTime, create_engine, inspect, text
+
 from config import Config
+from migrate_columns import backfill_not_null
+from migrate_indexes import cancel_duplicate_active_assignments
+from models import db
 
 # Configuración de SQLite (origen)
 SQLITE_DB_PATH = 'instance/inventario.db'
@@ -14,24 +52,278 @@ SQLITE_DB_PATH = 'instance/inventario.db'
 # Configuración de PostgreSQL (destino)
 POSTGRES_URI = Config.SQLALCHEMY_DATABASE_URI
 
-def migrate_data():
-    """Migra los datos de SQLite a PostgreSQL"""
-    
-    print("Iniciando migración de SQLite a PostgreSQL...")
-    
-    # Conectar a SQLite
-    if not os.path.exists(SQLITE_DB_PATH):
-        print(f"Error: No se encontró la base de datos SQLite en {SQLITE_DB_PATH}")
+CHECKPOINT_PATH = 'instance/migration_checkpoint.json'
+
+# Contadores de los ETag de los listados (ver conditional.py): no se copian.
+# init-db crea en el destino las filas que falten y al terminar la migración se
+# incrementan las que ya existan, así ningún ETag anterior sigue siendo válido
+SKIPPED_TABLES = {'table_version'}
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    with _print_lock:
+        print(message, flush=True)
+
+
+class Checkpoint:
+    """Último id copiado por tabla, guardado en un archivo JSON tras cada lote."""
+
+    def __init__(self, path, target_url, restart=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {'target': target_url, 'tables': {}}
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get('target') == target_url:
+                self.data = saved
+            else:
+                log(f"  - El punto de control es de otro destino ({saved.get('target')}), se ignora")
+
+    def table(self, name):
+        with self._lock:
+            return dict(self.data['tables'].get(name, {'last_id': 0, 'rows': 0, 'done': False}))
+
+    def update(self, name, **values):
+        with self._lock:
+            self.data['tables'].setdefault(name, {'last_id': 0, 'rows': 0, 'done': False}).update(values)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def dependency_levels(tables):
+    """Agrupa las tablas en niveles: cada nivel solo depende de los anteriores."""
+    names = {table.name for table in tables}
+    pending = {table.name: {fk.column.table.name for fk in table.foreign_keys
+                            if fk.column.table.name in names and fk.column.table.name != table.name}
+               for table in tables}
+    by_name = {table.name: table for table in tables}
+    levels = []
+    while pending:
+        ready = sorted(name for name, deps in pending.items() if not deps)
+        if not ready:
+            raise RuntimeError(f"Dependencias circulares entre {', '.join(pending)}")
+        levels.append([by_name[name] for name in ready])
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return levels
+
+
+def source_columns(sqlite_conn, table):
+    existing = {row[1] for row in sqlite_conn.execute(f'PRAGMA table_info("{table.name}")')}
+    return [column for column in table.columns if column.name in existing]
+
+
+def _csv_field(value):
+    # En COPY ... (FORMAT csv) solo un campo vacío sin comillas es NULL; "" es la
+    # cadena vacía. El módulo csv (antes de QUOTE_NOTNULL en 3.12) escribe None
+    # como "" con QUOTE_NONNUMERIC, así que los campos se citan aquí
+    if value is None:
+        return ''
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_batch(conn, table, columns, rows, preparer):
+    buffer = io.StringIO()
+    buffer.writelines(','.join(_csv_field(value) for value in row) + '\n' for row in rows)
+    buffer.seek(0)
+    column_list = ', '.join(preparer.quote(column.name) for column in columns)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {preparer.format_table(table)} ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                           buffer)
+    finally:
+        cursor.close()
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def copy_table(table, sqlite_path, engine, checkpoint, batch_size):
+    state = checkpoint.table(table.name)
+    if state['done']:
+        log(f"  = {table.name}: ya migrada ({state['rows']} filas)")
+        return state['rows']
+
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    try:
+        columns = source_columns(sqlite_conn, table)
+        if not columns:
+            log(f"  - {table.name}: no existe en el origen, se omite")
+            checkpoint.update(table.name, done=True)
+            return 0
+        preparer = engine.dialect.identifier_preparer
+        is_postgres = engine.dialect.name == 'postgresql'
+        select = (f'SELECT {", ".join(chr(34) + c.name + chr(34) for c in columns)} FROM "{table.name}" '
+                  f'WHERE id > ? ORDER BY id LIMIT ?')
+        total = sqlite_conn.execute(f'SELECT COUNT(*) FROM "{table.name}"').fetchone()[0]
+        last_id, copied = state['last_id'], state['rows']
+        started = time.perf_counter()
+        copied_now = 0
+
+        with engine.connect() as conn:
+            target = preparer.format_table(table)
+            if state.get('started'):
+                # Un lote confirmado sin que se llegara a guardar el punto de control
+                already = conn.execute(text(f"SELECT MAX(id) FROM {target} WHERE id > :id"),
+                                       {'id': last_id}).scalar()
+                if already is not None:
+                    copied += conn.execute(text(f"SELECT COUNT(*) FROM {target} WHERE id > :id"),
+                                           {'id': last_id}).scalar()
+                    last_id = already
+                    checkpoint.update(table.name, last_id=last_id, rows=copied)
+                log(f"  > {table.name}: se reanuda después del id {last_id}")
+            elif conn.execute(text(f"SELECT 1 FROM {target} LIMIT 1")).first() is not None:
+                raise RuntimeError(f"La tabla {table.name} del destino ya tiene datos; "
+                                   f"use --truncate para vaciarla antes de migrar")
+            else:
+                checkpoint.update(table.name, started=True)
+            conn.commit()
+
+            id_index = [column.name for column in columns].index('id')
+            while True:
+                rows = sqlite_conn.execute(select, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                with conn.begin():
+                    if is_postgres:
+                        _copy_batch(conn, table, columns, rows, preparer)
+                    else:
+                        # Sin COPY los valores pasan por los tipos de SQLAlchemy: fechas como datetime
+                        conn.execute(table.insert(), [
+                            {column.name: _parse_datetime(value) if isinstance(column.type, DateTime) else value
+                             for column, value in zip(columns, row)}
+                            for row in rows])
+                last_id = rows[-1][id_index]
+                copied += len(rows)
+                copied_now += len(rows)
+                checkpoint.update(table.name, last_id=last_id, rows=copied)
+                elapsed = time.perf_counter() - started
+                log(f"    {table.name}: {copied}/{total} filas ({copied_now / elapsed:,.0f} filas/s)")
+
+        checkpoint.update(table.name, done=True)
+        log(f"  ✓ {copied} registros migrados de {table.name}")
+        return copied
+    finally:
+        sqlite_conn.close()
+
+
+def truncate_tables(engine, tables, checkpoint):
+    """Vacía las tablas del destino que aún no empezaron a migrarse."""
+    preparer = engine.dialect.identifier_preparer
+    pending = [table for table in tables if not checkpoint.table(table.name).get('started')]
+    if not pending:
         return
-    
-    sqlite_conn = sqlite3.connect(SQLITE_DB_PATH)
-    sqlite_conn.row_factory = sqlite3.Row
-    sqlite_cursor = sqlite_conn.cursor()
-    
-    # Conectar a PostgreSQL
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            names = ', '.join(preparer.format_table(table) for table in pending)
+            conn.execute(text(f"TRUNCATE TABLE {names} CASCADE"))
+        else:
+            for table in reversed(pending):
+                conn.execute(table.delete())
+    log(f"✓ Tablas vaciadas: {', '.join(table.name for table in pending)}")
+
+
+def prepare_source(sqlite_path):
+    """Ajusta el origen a las restricciones del destino. Devuelve las asignaciones canceladas."""
+    source = create_engine(f'sqlite:///{sqlite_path}')
     try:
-        postgres_engine = create_engine(POSTGRES_URI)
-        postgres_conn = postgres_engine.connect()
+        # Columnas que el destino crea NOT NULL (ver migrate_columns.py)
+        backfill_not_null(source)
+        with source.begin() as conn:
+            if not inspect(conn).has_table('assignment'):
+                return 0
+            return cancel_duplicate_active_assignments(conn)
+    finally:
+        source.dispose()
+
+
+def bump_table_versions(engine):
+    """Invalida los ETag de los listados del destino tras cargar los datos."""
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE table_version SET version = version + 1"))
+
+
+def reset_sequences(engine, tables):
+    """Ajusta las secuencias de ids al máximo copiado (COPY no las avanza)."""
+    if engine.dialect.name != 'postgresql':
+        return
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in tables:
+            if 'id' not in table.columns:
+                continue
+            name = preparer.format_table(table)
+            conn.execute(text(f"SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                              f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {name}"),
+                         {'table': name})
+    log("✓ Secuencias sincronizadas")
+
+
+def _normalize(value, column):
+    if value is None:
+        return '\\N'
+    if isinstance(column.type, DateTime):
+        return _parse_datetime(value).isoformat(sep=' ', timespec='microseconds')
+    return str(value)
+
+
+def _checksum(rows, columns):
+    digest = hashlib.md5()
+    count = 0
+    for row in rows:
+        digest.update('\x1f'.join(_normalize(value, column) for value, column in zip(row, columns)).encode())
+        digest.update(b'\x1e')
+        count += 1
+    return count, digest.hexdigest()
+
+
+def verify_table(table, sqlite_path, engine, batch_size):
+    """Compara conteo y checksum (md5 de las filas en orden de id) entre origen y destino."""
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    try:
+        columns = source_columns(sqlite_conn, table)
+        if not columns:
+            return True
+        names = ', '.join(f'"{column.name}"' for column in columns)
+        source = _checksum(sqlite_conn.execute(f'SELECT {names} FROM "{table.name}" ORDER BY id'), columns)
+    finally:
+        sqlite_conn.close()
+
+    preparer = engine.dialect.identifier_preparer
+    target_names = ', '.join(preparer.quote(column.name) for column in columns)
+    with engine.connect().execution_options(yield_per=batch_size) as conn:
+        rows = conn.execute(text(f"SELECT {target_names} FROM {preparer.format_table(table)} ORDER BY id"))
+        target = _checksum(rows, columns)
+
+    ok = source == target
+    log(f"  {'✓' if ok else '✗'} {table.name}: origen {source[0]} filas ({source[1][:12]}), "
+        f"destino {target[0]} filas ({target[1][:12]})")
+    return ok
+
+
+def migrate_data(sqlite_path=SQLITE_DB_PATH, target_url=POSTGRES_URI, batch_size=5000, jobs=3,
+                 checkpoint_path=CHECKPOINT_PATH, restart=False, verify_only=False, truncate=False):
+    """Migra los datos de SQLite a PostgreSQL. Devuelve True si la verificación es correcta."""
+    print("Iniciando migración de SQLite a PostgreSQL...")
+
+    if not os.path.exists(sqlite_path):
+        print(f"Error: No se encontró la base de datos SQLite en {sqlite_path}")
+        return False
+
+    try:
+        engine = create_engine(target_url, pool_size=jobs, max_overflow=1) \
+            if target_url.startswith('postgresql') else create_engine(target_url)
+        with engine.connect():
+            pass
         print("✓ Conexión a PostgreSQL establecida")
     except Exception as e:
         print(f"Error al conectar a PostgreSQL: {e}")
@@ -39,67 +331,66 @@ def migrate_data():
         print("1. PostgreSQL esté instalado y corriendo")
         print("2. La base de datos 'inventario' exista")
         print("3. Las credenciales en config.py sean correctas")
-        sqlite_conn.close()
-        return
-    
-    # Lista de tablas a migrar (en orden de dependencias)
-    tables = ['user', 'department', 'area', 'personnel', 'equipment', 'assignment']
-    
-    try:
+        return False
+
+    tables = [table for table in db.metadata.sorted_tables if table.name not in SKIPPED_TABLES]
+    levels = dependency_levels(tables)
+
+    if not verify_only:
         # Crear las tablas en PostgreSQL si no existen
         print("\nCreando tablas en PostgreSQL...")
-        from app import app, db
-        with app.app_context():
-            db.create_all()
+        db.metadata.create_all(engine)
         print("✓ Tablas creadas/verificadas")
-        
-        # Migrar datos de cada tabla
-        for table in tables:
-            print(f"\nMigrando tabla: {table}")
-            
-            # Obtener datos de SQLite
-            sqlite_cursor.execute(f"SELECT * FROM {table}")
-            rows = sqlite_cursor.fetchall()
-            
-            if not rows:
-                print(f"  - Tabla {table} está vacía, saltando...")
-                continue
-            
-            # Limpiar tabla en PostgreSQL (opcional, comentar si quieres mantener datos existentes)
-            # postgres_conn.execute(text(f"TRUNCATE TABLE {table} CASCADE"))
-            
-            # Insertar datos en PostgreSQL
-            inserted = 0
-            for row in rows:
-                try:
-                    # Construir query de inserción
-                    columns = ', '.join(row.keys())
-                    placeholders = ', '.join([f':{key}' for key in row.keys()])
-                    values = {key: row[key] for key in row.keys()}
-                    
-                    query = text(f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON CONFLICT DO NOTHING")
-                    postgres_conn.execute(query, values)
-                    postgres_conn.commit()
-                    inserted += 1
-                except Exception as e:
-                    print(f"  - Error al insertar fila: {e}")
-                    postgres_conn.rollback()
-                    continue
-            
-            print(f"  ✓ {inserted} registros migrados de {table}")
-        
+
+        checkpoint = Checkpoint(checkpoint_path, engine.url.render_as_string(hide_password=True), restart)
+        if truncate:
+            truncate_tables(engine, tables, checkpoint)
+        cancelled = prepare_source(sqlite_path)
+        if cancelled:
+            print(f"✓ {cancelled} asignaciones activas duplicadas marcadas como 'Cancelada' en el origen")
+        started = time.perf_counter()
+        total = 0
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                for level in levels:
+                    print(f"\nMigrando tablas: {', '.join(table.name for table in level)}")
+                    futures = [executor.submit(copy_table, table, sqlite_path, engine, checkpoint, batch_size)
+                               for table in level]
+                    total += sum(future.result() for future in futures)
+        except Exception as e:
+            print(f"\nError durante la migración: {e}")
+            print("Vuelve a ejecutar el script para continuar desde el último lote copiado.")
+            engine.dispose()
+            return False
+        elapsed = time.perf_counter() - started
+        print(f"\n✓ {total} registros en {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} filas/s)")
+        reset_sequences(engine, tables)
+        bump_table_versions(engine)
+
+    print("\nVerificando conteos y checksums...")
+    ok = all([verify_table(table, sqlite_path, engine, batch_size) for table in tables])
+    engine.dispose()
+    if ok:
         print("\n✓ Migración completada exitosamente!")
-        print(f"\nDatos migrados a: {POSTGRES_URI}")
-        
-    except Exception as e:
-        print(f"\nError durante la migración: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        sqlite_conn.close()
-        postgres_conn.close()
-        print("\nConexiones cerradas")
+        print(f"\nDatos migrados a: {engine.url.render_as_string(hide_password=True)}")
+        if not verify_only and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+    else:
+        print("\n✗ Hay diferencias entre origen y destino")
+    return ok
 
-if __name__ == '__main__':
-    migrate_data()
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migra los datos de SQLite a PostgreSQL')
+    parser.add_argument('--sqlite', default=SQLITE_DB_PATH)
+    parser.add_argument('--database-url', default=POSTGRES_URI)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--jobs', type=int, default=3)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--restart', action='store_true')
+    parser.add_argument('--verify-only', action='store_true')
+    parser.add_argument('--truncate', action='store_true')
+    args = parser.parse_args()
+    ok = migrate_data(args.sqlite, args.database_url, args.batch_size, args.jobs,
+                      args.checkpoint, args.restart, args.verify_only, args.truncate)
+    sys.exit(0 if ok else 1)
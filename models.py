@@ -1,10 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import hash_password, verify_password
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Índice que impide dos asignaciones activas del mismo equipo (ver Assignment)
+ACTIVE_ASSIGNMENT_INDEX = 'uq_assignment_active_equipment'
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -12,11 +15,12 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Ambos se calculan en el pool de password_hashing y pueden lanzar HashingBusy
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class Department(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -39,13 +43,25 @@ class Personnel(db.Model):
     phone = db.Column(db.String(20))
     position = db.Column(db.String(100))
     employee_id = db.Column(db.String(50), unique=True)
-    department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
-    area_id = db.Column(db.Integer, db.ForeignKey('area.id'), nullable=True)
+    department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False, index=True)
+    area_id = db.Column(db.Integer, db.ForeignKey('area.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relaciones
     equipments = db.relationship('Equipment', backref='assigned_personnel', lazy=True)
     
+    __table_args__ = (
+        # Listado ordenado por nombre
+        db.Index('ix_personnel_name', name),
+        # Búsqueda por prefijo (typeahead)
+        db.Index('ix_personnel_name_lower', db.func.lower(name).label('name_lower'),
+                 postgresql_ops={'name_lower': 'text_pattern_ops'}),
+        db.Index('ix_personnel_last_name_lower', db.func.lower(last_name).label('last_name_lower'),
+                 postgresql_ops={'last_name_lower': 'text_pattern_ops'}),
+        db.Index('ix_personnel_employee_id_lower', db.func.lower(employee_id).label('employee_id_lower'),
+                 postgresql_ops={'employee_id_lower': 'text_pattern_ops'}),
+    )
+    
     def __repr__(self):
         return f'<Personnel {self.name} {self.last_name}>'
 
@@ -73,29 +89,45 @@ class Equipment(db.Model):
     status = db.Column(db.String(50), nullable=False, default='Disponible')  # Disponible, Asignado, Mantenimiento, Baja
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=False)
     area_id = db.Column(db.Integer, db.ForeignKey('area.id'), nullable=True)
-    assigned_to_id = db.Column(db.Integer, db.ForeignKey('personnel.id'), nullable=True)
-    image_filename = db.Column(db.String(255), nullable=True)
+    assigned_to_id = db.Column(db.Integer, db.ForeignKey('personnel.id'), nullable=True, index=True)
+    image_filename = db.Column(db.String(255), nullable=True, index=True)  # <sha256>.<ext>, ver uploads.py
     ip_address = db.Column(db.String(45), nullable=True)  # IPv4 o IPv6 (máx 45 caracteres)
     physical_address = db.Column(db.String(50), nullable=True)  # Dirección MAC
     specifications = db.Column(db.Text, nullable=True)  # Especificaciones técnicas (RAM, Procesador, etc.)
-    registration_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    registration_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     assignment_date = db.Column(db.DateTime, nullable=True)
     purchase_date = db.Column(db.DateTime)
-    warranty_expiry = db.Column(db.DateTime)
+    warranty_expiry = db.Column(db.DateTime, index=True)
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: el cursor del listado compara (created_at, id) y una fila con NULL
+    # no entraría en ninguna página siguiente (migrate_columns.py rellena las antiguas)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Control de concurrencia optimista (ver concurrency.py)
+    version_id = db.Column(db.Integer, nullable=False, server_default=db.text('1'))
     
     # Relaciones
     assignments = db.relationship('Assignment', backref='equipment', lazy=True, cascade='all, delete-orphan')
     
+    # El listado pagina por (created_at, id): cada filtro lleva esas columnas al
+    # final para que la página salga del índice ya ordenada. Los índices que
+    # empiezan por department_id y area_id cubren también esas llaves foráneas.
+    __table_args__ = (
+        db.Index('ix_equipment_created_at_id', created_at, id),
+        db.Index('ix_equipment_status_created_at', status, created_at, id),
+        db.Index('ix_equipment_type_created_at', equipment_type, created_at, id),
+        db.Index('ix_equipment_department_created_at', department_id, created_at, id),
+        db.Index('ix_equipment_area_created_at', area_id, created_at, id),
+    )
+    __mapper_args__ = {'version_id_col': version_id}
+    
     def __repr__(self):
         return f'<Equipment {self.code}>'
 
 class Assignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=False)
-    personnel_id = db.Column(db.Integer, db.ForeignKey('personnel.id'), nullable=False)
+    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=False, index=True)
+    personnel_id = db.Column(db.Integer, db.ForeignKey('personnel.id'), nullable=False, index=True)
     assignment_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     return_date = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(50), nullable=False, default='Activa')  # Activa, Devuelta, Cancelada
@@ -103,10 +135,33 @@ class Assignment(db.Model):
     assigned_by = db.Column(db.String(100))  # Usuario que realizó la asignación
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Control de concurrencia optimista (ver concurrency.py)
+    version_id = db.Column(db.Integer, nullable=False, server_default=db.text('1'))
     
     # Relaciones
     personnel = db.relationship('Personnel', backref='assignments', lazy=True)
     
+    # Listados paginados por (assignment_date, id): activas y el historial.
+    # Índice único parcial: a lo sumo una asignación activa por equipo, aunque
+    # dos workers asignen el mismo equipo a la vez
+    __table_args__ = (
+        db.Index('ix_assignment_status_date', status, assignment_date, id),
+        db.Index('ix_assignment_date_id', assignment_date, id),
+        db.Index(ACTIVE_ASSIGNMENT_INDEX, equipment_id, unique=True,
+                 postgresql_where=status == 'Activa', sqlite_where=status == 'Activa'),
+    )
+    __mapper_args__ = {'version_id_col': version_id}
+    
     def __repr__(self):
         return f'<Assignment {self.equipment.code} -> {self.personnel.name}>'
 
+
+class TableVersion(db.Model):
+    # Contador de cambios por tabla, incrementado en la misma transacción que la
+    # escritura (ver conditional.py); valida los ETag de los listados
+    __tablename__ = 'table_version'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TableVersion {self.name}={self.version}>'
@@ -0,0 +1,92 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En lugar de OFFSET, cada página se pide a partir de los valores de orden de la
+última (o primera) fila mostrada, de modo que el costo de una página no crece
+con el tamaño de la tabla.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    """Una página de resultados con los cursores para navegar."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(item, columns):
+    values = []
+    for column in columns:
+        value = getattr(item, column.key)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """Devuelve la tupla de valores del cursor o None si no es válido."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        decoded = []
+        for column, value in zip(columns, values):
+            if column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            else:
+                value = column.type.python_type(value)
+            decoded.append(value)
+        return tuple(decoded)
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+def paginate_keyset(query, columns, per_page, after=None, before=None):
+    """
+    Pagina `query` en orden descendente por `columns` (p. ej. created_at, id).
+
+    `after` pide la página siguiente a un cursor y `before` la anterior. Las
+    columnas deben identificar cada fila de forma única (terminar en el id).
+    """
+    key = tuple_(*columns)
+    after_values = decode_cursor(after, columns)
+    before_values = decode_cursor(before, columns)
+
+    if before_values is not None:
+        # Página anterior: se recorre en orden ascendente y luego se invierte
+        rows = (query.filter(key > tuple_(*before_values))
+                .order_by(*[c.asc() for c in columns])
+                .limit(per_page + 1)
+                .all())
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        next_cursor = encode_cursor(items[-1], columns) if items else None
+        prev_cursor = encode_cursor(items[0], columns) if items and has_more else None
+        return KeysetPage(items, next_cursor, prev_cursor)
+
+    if after_values is not None:
+        query = query.filter(key < tuple_(*after_values))
+    rows = query.order_by(*[c.desc() for c in columns]).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    next_cursor = encode_cursor(items[-1], columns) if items and has_more else None
+    prev_cursor = encode_cursor(items[0], columns) if items and after_values is not None else None
+    return KeysetPage(items, next_cursor, prev_cursor)
@@ -0,0 +1,195 @@
+"""
+Hash y verificación de contraseñas en un pool de procesos acotado.
+
+scrypt es costoso a propósito: una ráfaga de inicios de sesión puede ocupar
+todos los workers de gunicorn y bloquear el resto de páginas. Aquí el cálculo
+se hace en un pool de PASSWORD_HASH_WORKERS procesos por worker, y en toda la
+máquina solo puede haber PASSWORD_HASH_QUEUE operaciones en curso: las plazas
+son archivos en PASSWORD_HASH_LOCK_DIR bloqueados con flock, compartidos por
+todos los workers e hilos (el sistema las libera si un proceso muere). Si no
+hay plaza libre se espera hasta PASSWORD_HASH_WAIT segundos; si sigue sin
+haberla, o el resultado tarda más de PASSWORD_HASH_TIMEOUT segundos, se lanza
+HashingBusy. Un cálculo que supera el tiempo sigue en el pool aunque la
+petición ya respondió, así que conserva su plaza hasta terminar.
+
+El límite solo deja libres workers para otras páginas si es menor que
+workers × hilos de gunicorn; render.yaml arranca gunicorn con --threads. Un
+inicio de sesión que espera plaza también ocupa su hilo, pero a lo sumo
+PASSWORD_HASH_WAIT segundos y sin usar CPU. Sin fcntl (Windows, solo
+desarrollo) el límite es por proceso.
+
+El método de hash es configurable (PASSWORD_HASH_METHOD, formato de Werkzeug,
+p. ej. 'scrypt:32768:8:1' o 'pbkdf2:sha256:600000'); los hashes con otro
+método se recalculan al iniciar sesión (ver needs_rehash).
+
+Los procesos del pool se crean con fork al iniciar la aplicación en cada
+worker; si el proceso cambió desde entonces (gunicorn --preload) el pool se
+vuelve a crear en el primer uso.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingBusy(Exception):
+    """No hay capacidad para calcular el hash ahora mismo."""
+
+
+DEFAULT_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'inventario-password-hash')
+
+
+class FileSlots:
+    """Plazas compartidas entre procesos: un archivo por plaza, tomado con flock."""
+
+    def __init__(self, directory, count):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f'slot-{n}.lock') for n in range(count)]
+
+    def _try_acquire(self):
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def acquire(self, wait=0):
+        """Descriptor de la plaza tomada, o None si siguen ocupadas tras `wait` segundos."""
+        # flock no admite un tiempo máximo de espera: se reintenta con pausas crecientes
+        deadline = time.monotonic() + wait
+        delay = 0.01
+        while True:
+            fd = self._try_acquire()
+            if fd is not None:
+                return fd
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.1)
+
+    def release(self, fd):
+        # Desbloqueo explícito: un proceso hijo que heredó el descriptor no retiene la plaza
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class ThreadSlots:
+    """Plazas del proceso actual, para sistemas sin fcntl."""
+
+    def __init__(self, count):
+        self._semaphore = threading.BoundedSemaphore(count)
+
+    def acquire(self, wait=0):
+        return True if self._semaphore.acquire(timeout=wait) else None
+
+    def release(self, token):
+        self._semaphore.release()
+
+
+_config = {'method': DEFAULT_METHOD, 'workers': 1, 'queue': 2, 'wait': 5.0, 'timeout': 5.0}
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_slots = ThreadSlots(_config['queue'])
+
+
+def init_app(app):
+    global _slots
+    _config.update(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 1),
+        queue=app.config.get('PASSWORD_HASH_QUEUE', 2),
+        wait=app.config.get('PASSWORD_HASH_WAIT', 5.0),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 5.0),
+    )
+    count = max(_config['queue'], 1)
+    if fcntl is not None:
+        _slots = FileSlots(app.config.get('PASSWORD_HASH_LOCK_DIR') or DEFAULT_LOCK_DIR, count)
+    else:
+        _slots = ThreadSlots(count)
+    if _config['workers'] > 0:
+        _start_processes()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor_pid = os.getpid()
+            # fork y no spawn: spawn volvería a importar el módulo principal (app.py) en cada proceso
+            _executor = ProcessPoolExecutor(max_workers=_config['workers'],
+                                            mp_context=multiprocessing.get_context('fork'))
+            # Con fork todos los procesos se crean en el primer submit: aquí, antes de
+            # tomar una plaza, para que no hereden su descriptor
+            _executor.submit(int).result()
+        return _executor
+
+
+def _start_processes():
+    # Los procesos se crean al iniciar la aplicación en cada worker de gunicorn, cuando
+    # aún no hay otros hilos ni conexiones abiertas que el fork pudiera copiar
+    _get_executor()
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _run(function, *args):
+    executor = _get_executor() if _config['workers'] > 0 else None
+    slot = _slots.acquire(_config['wait'])
+    if slot is None:
+        raise HashingBusy('Demasiadas operaciones de contraseña en curso')
+    release = True
+    try:
+        if executor is None:
+            return function(*args)
+        future = executor.submit(function, *args)
+        try:
+            return future.result(timeout=_config['timeout'])
+        except FutureTimeoutError:
+            # cancel() no detiene un cálculo que ya empezó: la plaza se libera cuando termine
+            if not future.cancel():
+                release = False
+                future.add_done_callback(lambda _: _slots.release(slot))
+            raise HashingBusy('El cálculo de la contraseña tardó demasiado')
+        except BrokenProcessPool:
+            # Un proceso del pool murió: se recrea en la siguiente operación
+            _reset_executor()
+            raise HashingBusy('El pool de contraseñas se reinició')
+    finally:
+        if release:
+            _slots.release(slot)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _config['method'])
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """El hash se calculó con otro método o parámetros que los configurados."""
+    return password_hash.split('$', 1)[0] != _config['method']
@@ -0,0 +1,231 @@
+"""
+Búsqueda de equipos por código, serial, marca, modelo, especificaciones y notas.
+
+- PostgreSQL: índice GIN de trigramas (pg_trgm) sobre un documento de búsqueda
+  en minúsculas; admite coincidencias parciales como 'S/ULA:12'.
+- SQLite: tabla virtual FTS5 con tokenizador de trigramas, mantenida con
+  triggers sobre la tabla equipment.
+- Si el índice no existe (o la consulta es muy corta) se usa ILIKE.
+"""
+from sqlalchemy import and_, case, func, literal_column, or_, text
+
+from models import db, Equipment, Department, Personnel
+
+SEARCH_INDEX = 'ix_equipment_search_trgm'
+FTS_TABLE = 'equipment_fts'
+
+# Peso de cada columna en el ranking de FTS5 (code, serial, brand, model, specifications, notes)
+FTS_WEIGHTS = (10.0, 8.0, 3.0, 3.0, 1.0, 1.0)
+
+_POSTGRES_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON equipment USING gin ((
+        lower(coalesce(code, '') || ' ' || coalesce(serial, '') || ' ' ||
+              coalesce(brand, '') || ' ' || coalesce(model, '') || ' ' ||
+              coalesce(specifications, '') || ' ' || coalesce(notes, ''))
+    ) gin_trgm_ops)""",
+]
+
+_SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        code, serial, brand, model, specifications, notes,
+        content='equipment', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS equipment_fts_ai AFTER INSERT ON equipment BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, code, serial, brand, model, specifications, notes)
+        VALUES (new.id, new.code, new.serial, new.brand, new.model, new.specifications, new.notes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS equipment_fts_ad AFTER DELETE ON equipment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code, serial, brand, model, specifications, notes)
+        VALUES ('delete', old.id, old.code, old.serial, old.brand, old.model, old.specifications, old.notes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS equipment_fts_au AFTER UPDATE ON equipment BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code, serial, brand, model, specifications, notes)
+        VALUES ('delete', old.id, old.code, old.serial, old.brand, old.model, old.specifications, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, code, serial, brand, model, specifications, notes)
+        VALUES (new.id, new.code, new.serial, new.brand, new.model, new.specifications, new.notes);
+    END""",
+]
+
+# Resultado de la detección del índice, por URL de base de datos
+_available = {}
+
+
+def setup_search(rebuild=False):
+    """Crea el índice de búsqueda del motor actual (idempotente)."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        statements = list(_POSTGRES_SETUP)
+    elif dialect == 'sqlite':
+        with db.engine.connect() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}).first()
+        statements = list(_SQLITE_SETUP)
+        # Una tabla FTS nueva sobre datos existentes debe poblarse
+        if rebuild or not exists:
+            statements.append(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    else:
+        return False
+
+    with db.engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    _available.pop(str(db.engine.url), None)
+    return True
+
+
+def search_available():
+    """Indica si el índice de búsqueda existe en la base de datos actual."""
+    key = str(db.engine.url)
+    if key not in _available:
+        dialect = db.engine.dialect.name
+        with db.engine.connect() as conn:
+            if dialect == 'postgresql':
+                found = conn.execute(text(
+                    "SELECT 1 FROM pg_indexes WHERE indexname = :name"), {'name': SEARCH_INDEX}).first()
+            elif dialect == 'sqlite':
+                found = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': FTS_TABLE}).first()
+            else:
+                found = None
+        _available[key] = found is not None
+    return _available[key]
+
+
+def _tokens(term):
+    return [token.lower() for token in term.split() if token]
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_document():
+    # Debe coincidir con la expresión del índice de PostgreSQL
+    sep = literal_column("' '")
+    empty = literal_column("''")
+    parts = [func.coalesce(column, empty) for column in (
+        Equipment.code, Equipment.serial, Equipment.brand, Equipment.model,
+        Equipment.specifications, Equipment.notes)]
+    document = parts[0]
+    for part in parts[1:]:
+        document = document.op('||')(sep).op('||')(part)
+    return func.lower(document)
+
+
+def _fts_query(tokens):
+    # Cada palabra como frase: con el tokenizador de trigramas equivale a una subcadena
+    return ' '.join('"{}"'.format(token.replace('"', '""')) for token in tokens)
+
+
+def _use_fts(tokens):
+    # FTS5 con trigramas no puede buscar palabras de menos de 3 caracteres
+    return db.engine.dialect.name == 'sqlite' and all(len(token) >= 3 for token in tokens)
+
+
+def _ilike_filter(tokens):
+    columns = (Equipment.code, Equipment.serial, Equipment.brand, Equipment.model,
+               Equipment.specifications, Equipment.notes)
+    return and_(*[or_(*[column.ilike(f"%{_escape_like(token)}%", escape='\\') for column in columns])
+                  for token in tokens])
+
+
+def match_clause(term):
+    """Condición WHERE para filtrar equipos por `term` (todas las palabras deben aparecer)."""
+    tokens = _tokens(term)
+    if not tokens:
+        return None
+    if search_available():
+        if db.engine.dialect.name == 'postgresql':
+            document = _search_document()
+            return and_(*[document.like(f"%{_escape_like(token)}%", escape='\\') for token in tokens])
+        if _use_fts(tokens):
+            matches = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query") \
+                .bindparams(fts_query=_fts_query(tokens))
+            return Equipment.id.in_(matches)
+    return _ilike_filter(tokens)
+
+
+def search_equipment(term, limit=20, offset=0, statuses=None):
+    """
+    Devuelve los equipos que coinciden con `term` ordenados por relevancia.
+
+    Cada resultado es una fila con id, code, serial, equipment_type, brand,
+    model, status, ip_address, department y score (mayor es más relevante).
+    `statuses` limita la búsqueda a esos estatus.
+    """
+    tokens = _tokens(term)
+    if not tokens:
+        return []
+
+    columns = [Equipment.id, Equipment.code, Equipment.serial, Equipment.equipment_type,
+               Equipment.brand, Equipment.model, Equipment.status, Equipment.ip_address,
+               Department.name.label('department')]
+    prefix = f"{_escape_like(term.strip().lower())}%"
+    # Coincidencias por prefijo de código o serial primero (p. ej. 'S/ULA:12')
+    prefix_boost = case(
+        (func.lower(Equipment.code).like(prefix, escape='\\'), 2.0),
+        (func.lower(Equipment.serial).like(prefix, escape='\\'), 1.0),
+        else_=0.0,
+    )
+
+    if search_available() and db.engine.dialect.name == 'sqlite' and _use_fts(tokens):
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        fts = text(f"""SELECT rowid AS id, -bm25({FTS_TABLE}, {weights}) AS relevance
+                       FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query""") \
+            .bindparams(fts_query=_fts_query(tokens)) \
+            .columns(id=db.Integer, relevance=db.Float) \
+            .subquery('fts')
+        score = (prefix_boost * 100 + fts.c.relevance).label('score')
+        query = (db.session.query(*columns, score)
+                 .join(fts, fts.c.id == Equipment.id))
+    elif search_available() and db.engine.dialect.name == 'postgresql':
+        document = _search_document()
+        score = (prefix_boost + func.word_similarity(term.strip().lower(), document)).label('score')
+        query = db.session.query(*columns, score).filter(match_clause(term))
+    else:
+        score = prefix_boost.label('score')
+        query = db.session.query(*columns, score).filter(_ilike_filter(tokens))
+
+    query = query.join(Department, Department.id == Equipment.department_id)
+    if statuses:
+        query = query.filter(Equipment.status.in_(statuses))
+
+    return (query.order_by(score.desc(), Equipment.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all())
+
+
+def prefix_match(expression, prefix):
+    """
+    Condición `expression` empieza por `prefix` que puede usar un índice.
+
+    En PostgreSQL se usa LIKE 'x%' (índice con text_pattern_ops); en SQLite un
+    rango equivalente, ya que LIKE no usa índices sobre expresiones.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return and_(expression >= prefix, expression < prefix + '\U0010ffff')
+    return expression.like(f"{_escape_like(prefix)}%", escape='\\')
+
+
+def search_personnel(term, limit=20, offset=0):
+    """
+    Personas cuyo nombre, apellido o ID de empleado empiezan por las palabras
+    de `term` (todas deben coincidir), ordenadas por nombre.
+    """
+    tokens = _tokens(term)
+    if not tokens:
+        return []
+    conditions = [or_(prefix_match(func.lower(Personnel.name), token),
+                      prefix_match(func.lower(Personnel.last_name), token),
+                      prefix_match(func.lower(Personnel.employee_id), token))
+                  for token in tokens]
+    return (db.session.query(Personnel.id, Personnel.name, Personnel.last_name,
+                             Personnel.employee_id, Department.name.label('department'))
+            .join(Department, Department.id == Personnel.department_id)
+            .filter(and_(*conditions))
+            .order_by(Personnel.name, Personnel.last_name, Personnel.id)
+            .offset(offset)
+            .limit(limit)
+            .all())
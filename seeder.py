@@ -0,0 +1,204 @@
+"""
+Generador de un inventario sintético grande para reproducir la escala de producción.
+
+Genera departamentos, bibliotecas, personal, equipos y su historial de
+asignaciones con distribuciones parecidas a las reales: tipos y estatus
+tomados de las listas de EquipmentForm, equipos 'Asignado' con exactamente una
+asignación 'Activa' (la última de su historial) y el resto con asignaciones
+'Devuelta' o 'Cancelada' con fecha de devolución. El mismo `seed` produce
+siempre los mismos datos.
+
+Las filas se insertan por lotes fuera del unit of work del ORM: COPY en
+PostgreSQL, executemany en SQLite. Los ids se asignan aquí, así que al
+terminar se ajustan las secuencias de PostgreSQL.
+"""
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import cache
+import conditional
+from forms import EQUIPMENT_TYPES, EQUIPMENT_STATUSES
+from models import db, Department, Area, Personnel, Equipment, Assignment
+
+TABLES = [Department, Area, Personnel, Equipment, Assignment]
+
+# Peso relativo de cada tipo y estatus (los que no aparecen pesan 1)
+TYPE_WEIGHTS = {'Laptop': 24, 'Desktop': 20, 'Monitor': 16, 'Teclado': 8, 'Mouse': 8, 'Impresora': 5,
+                'Regulador': 4, 'Audífonos': 3, 'Tablet': 3, 'Router': 2, 'Switch': 2, 'Servidor': 2}
+STATUS_WEIGHTS = {'Disponible': 35, 'Asignado': 45, 'Mantenimiento': 8, 'Baja': 12}
+BRANDS = {
+    'Laptop': ['Dell', 'HP', 'Lenovo', 'Asus', 'Acer'],
+    'Desktop': ['Dell', 'HP', 'Lenovo', 'VIT', 'Siragon'],
+    'Monitor': ['Samsung', 'LG', 'Dell', 'AOC', 'ViewSonic'],
+    'Impresora': ['HP', 'Epson', 'Canon', 'Brother'],
+    'Router': ['Cisco', 'TP-Link', 'MikroTik'],
+    'Switch': ['Cisco', 'TP-Link', 'HP'],
+    'Servidor': ['Dell', 'HP', 'Lenovo'],
+}
+DEFAULT_BRANDS = ['Genius', 'Logitech', 'Microsoft', 'Kingston', 'Genérica']
+NETWORK_TYPES = {'Laptop', 'Desktop', 'Impresora', 'Router', 'Switch', 'Servidor'}
+FIRST_NAMES = ['María', 'José', 'Ana', 'Luis', 'Carmen', 'Pedro', 'Marta', 'Juan', 'Rosa', 'Carlos',
+               'Elena', 'Jorge', 'Laura', 'Miguel', 'Isabel', 'Andrés', 'Sofía', 'Diego', 'Lucía', 'Rafael']
+LAST_NAMES = ['González', 'Rodríguez', 'Pérez', 'Hernández', 'García', 'Martínez', 'López', 'Sánchez',
+              'Ramírez', 'Torres', 'Flores', 'Rivera', 'Gómez', 'Díaz', 'Morales', 'Rojas', 'Vargas',
+              'Castillo', 'Mendoza', 'Guerrero']
+POSITIONS = ['Analista', 'Asistente', 'Coordinador', 'Técnico', 'Bibliotecario', 'Jefe de Sección',
+             'Secretaria', 'Investigador', 'Profesor', 'Director']
+
+START = datetime(2015, 1, 1)
+END = datetime(2025, 1, 1)
+
+
+def _weighted(values, weights):
+    return [weights.get(value, 1) for value in values]
+
+
+def _copy(conn, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _insert(conn, model, columns, rows):
+    if not rows:
+        return
+    table = model.__table__
+    if conn.dialect.name == 'postgresql':
+        _copy(conn, table, columns, rows)
+    else:
+        conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+
+def existing_rows():
+    """Tablas del inventario que ya tienen filas."""
+    return [model.__tablename__ for model in TABLES if db.session.query(model.id).first() is not None]
+
+
+def truncate():
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            names = ', '.join(model.__tablename__ for model in reversed(TABLES))
+            conn.execute(text(f'TRUNCATE {names} RESTART IDENTITY CASCADE'))
+        else:
+            for model in reversed(TABLES):
+                conn.execute(model.__table__.delete())
+
+
+def _reset_sequences(conn):
+    for model in TABLES:
+        conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+                          f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {model.__tablename__}"))
+
+
+def _history(rng, equipment_id, registered, status, n_personnel, mean_assignments, first_id):
+    """Historial de asignaciones de un equipo; devuelve (filas, (persona, fecha) de la activa)."""
+    count = rng.randint(0, int(2 * mean_assignments))
+    if status == 'Asignado':
+        count = max(count, 1)
+    rows = []
+    current = min(registered + timedelta(days=rng.randint(0, 60)), END)
+    for n in range(count):
+        personnel_id = rng.randint(1, n_personnel)
+        returned = None if status == 'Asignado' and n == count - 1 else \
+            current + timedelta(days=rng.randint(15, 540))
+        if returned is not None and returned > END:
+            if status != 'Asignado':
+                break
+            # No cabe otra devolución antes del final del rango: esta queda activa
+            returned = None
+        state = 'Activa' if returned is None else ('Cancelada' if rng.random() < 0.03 else 'Devuelta')
+        rows.append((first_id + n, equipment_id, personnel_id, current, returned, state,
+                     None, 'admin', current, returned or current))
+        if returned is None:
+            return rows, (personnel_id, current)
+        current = min(returned + timedelta(days=rng.randint(0, 90)), END)
+    return rows, (None, None)
+
+
+def seed_inventory(seed=42, departments=300, areas=200, personnel=50000, equipment=1000000,
+                   assignments_per_equipment=3.0, batch_size=10000, progress=print):
+    """Inserta el inventario sintético en tablas vacías. Devuelve las filas insertadas por tabla."""
+    rng = random.Random(seed)
+    inserted = dict.fromkeys((model.__tablename__ for model in TABLES), 0)
+
+    with db.engine.begin() as conn:
+        _insert(conn, Department, ['id', 'name', 'description', 'created_at'], [
+            (i, f'Departamento {i:03d}', f'Departamento sintético {i}', START) for i in range(1, departments + 1)])
+        _insert(conn, Area, ['id', 'name', 'description', 'location', 'created_at'], [
+            (i, f'Biblioteca {i:03d}', None, f'Edificio {rng.randint(1, 40)}, piso {rng.randint(1, 6)}', START)
+            for i in range(1, areas + 1)])
+    inserted['department'], inserted['area'] = departments, areas
+
+    columns = ['id', 'name', 'last_name', 'email', 'phone', 'position', 'employee_id',
+               'department_id', 'area_id', 'created_at']
+    for first in range(1, personnel + 1, batch_size):
+        rows = []
+        for i in range(first, min(first + batch_size, personnel + 1)):
+            name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            rows.append((i, name, f'{last_name} {rng.choice(LAST_NAMES)}',
+                         f'{name.lower()}.{i}@example.com', f'0{rng.randint(412, 426)}-{rng.randint(1000000, 9999999)}',
+                         rng.choice(POSITIONS), f'E{i:06d}', rng.randint(1, departments),
+                         rng.randint(1, areas) if rng.random() < 0.8 else None, START))
+        with db.engine.begin() as conn:
+            _insert(conn, Personnel, columns, rows)
+        inserted['personnel'] += len(rows)
+    progress(f"✓ {departments} departamentos, {areas} bibliotecas, {personnel} personas")
+
+    type_weights = _weighted(EQUIPMENT_TYPES, TYPE_WEIGHTS)
+    status_weights = _weighted(EQUIPMENT_STATUSES, STATUS_WEIGHTS)
+    equipment_columns = ['id', 'code', 'serial', 'equipment_type', 'brand', 'model', 'status', 'department_id',
+                         'area_id', 'assigned_to_id', 'ip_address', 'registration_date', 'assignment_date',
+                         'purchase_date', 'warranty_expiry', 'created_at', 'updated_at']
+    assignment_columns = ['id', 'equipment_id', 'personnel_id', 'assignment_date', 'return_date', 'status',
+                          'notes', 'assigned_by', 'created_at', 'updated_at']
+    span = (END - START).total_seconds()
+    next_assignment = 1
+    for first in range(1, equipment + 1, batch_size):
+        equipment_rows, assignment_rows = [], []
+        for i in range(first, min(first + batch_size, equipment + 1)):
+            # Fechas de registro crecientes con el id, como en producción
+            registered = START + timedelta(seconds=span * (i - 1) / equipment + rng.randint(0, 3600))
+            equipment_type = rng.choices(EQUIPMENT_TYPES, type_weights)[0]
+            status = rng.choices(EQUIPMENT_STATUSES, status_weights)[0]
+            brand = rng.choice(BRANDS.get(equipment_type, DEFAULT_BRANDS))
+            history, (assigned_to, assigned_on) = _history(rng, i, registered, status, personnel,
+                                                           assignments_per_equipment, next_assignment)
+            next_assignment += len(history)
+            assignment_rows.extend(history)
+            purchased = registered - timedelta(days=rng.randint(0, 120))
+            equipment_rows.append((
+                i, f'S/ULA:{i}', f'{brand[:3].upper()}{i:09d}', equipment_type, brand,
+                f'{brand[:1]}{rng.randint(100, 9999)}', status, rng.randint(1, departments),
+                rng.randint(1, areas) if rng.random() < 0.75 else None, assigned_to,
+                f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}' if equipment_type in NETWORK_TYPES else None,
+                registered, assigned_on, purchased, purchased + timedelta(days=365 * rng.randint(1, 3)),
+                registered, registered,
+            ))
+        with db.engine.begin() as conn:
+            _insert(conn, Equipment, equipment_columns, equipment_rows)
+            _insert(conn, Assignment, assignment_columns, assignment_rows)
+        inserted['equipment'] += len(equipment_rows)
+        inserted['assignment'] += len(assignment_rows)
+        if inserted['equipment'] % (batch_size * 10) == 0 or inserted['equipment'] == equipment:
+            progress(f"  {inserted['equipment']}/{equipment} equipos, {inserted['assignment']} asignaciones")
+
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            _reset_sequences(conn)
+
+    # Las inserciones no pasaron por la sesión: invalidar cachés y ETag de los listados
+    names = [model.__tablename__ for model in TABLES]
+    db.session.connection()  # Abre la transacción para que el commit incremente table_version
+    conditional.mark_changed(db.session, *names)
+    db.session.commit()
+    cache.bump_tables(*names)
+    return inserted
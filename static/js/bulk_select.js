@@ -0,0 +1,37 @@
+// Selección múltiple para las acciones masivas.
+// Las casillas de las filas apuntan a un formulario con form="<id>"; la casilla
+// <input data-bulk-all="<id>"> del encabezado las marca o desmarca todas y el
+// elemento con data-bulk-count dentro del formulario muestra cuántas hay marcadas.
+(function () {
+    function initBulkSelect(form) {
+        const boxes = () => document.querySelectorAll(`input[name="ids"][form="${form.id}"]`);
+        const all = document.querySelector(`input[data-bulk-all="${form.id}"]`);
+        const counter = form.querySelector('[data-bulk-count]');
+
+        function update() {
+            const checked = Array.from(boxes()).filter((box) => box.checked).length;
+            if (counter) {
+                counter.textContent = `${counter.dataset.bulkCount} (${checked})`;
+            }
+            if (all) {
+                all.checked = checked > 0 && checked === boxes().length;
+                all.indeterminate = checked > 0 && checked < boxes().length;
+            }
+        }
+
+        if (all) {
+            all.addEventListener('change', () => {
+                boxes().forEach((box) => { box.checked = all.checked; });
+                update();
+            });
+        }
+        document.addEventListener('change', (event) => {
+            if (event.target.matches(`input[name="ids"][form="${form.id}"]`)) {
+                update();
+            }
+        });
+        update();
+    }
+
+    document.querySelectorAll('form[data-bulk-select]').forEach(initBulkSelect);
+})();
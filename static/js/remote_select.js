@@ -0,0 +1,122 @@
+// Selector con búsqueda remota.
+// Convierte un <select data-remote-url="..."> en un buscador que consulta la API
+// paginada (?q=&page=) y solo agrega al <select> la opción elegida, de modo que
+// la página no depende del tamaño del inventario.
+// Al elegir un resultado se dispara el evento 'remote-select' con el resultado completo.
+(function () {
+    function debounce(fn, wait) {
+        let timer;
+        return function (...args) {
+            clearTimeout(timer);
+            timer = setTimeout(() => fn.apply(this, args), wait);
+        };
+    }
+
+    function initRemoteSelect(select) {
+        const url = select.dataset.remoteUrl;
+        const params = select.dataset.remoteParams || '';
+        const allowEmpty = select.dataset.remoteEmpty;
+
+        const wrapper = document.createElement('div');
+        wrapper.className = 'position-relative mb-2';
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control form-control-sm';
+        input.placeholder = select.dataset.remotePlaceholder || 'Escribe para buscar...';
+        input.autocomplete = 'off';
+        const menu = document.createElement('div');
+        menu.className = 'list-group position-absolute w-100 shadow-sm remote-select-menu';
+        menu.style.display = 'none';
+        wrapper.appendChild(input);
+        wrapper.appendChild(menu);
+        select.parentNode.insertBefore(wrapper, select);
+
+        let page = 1;
+        let currentQuery = '';
+        let controller = null;
+
+        function choose(item) {
+            select.innerHTML = '';
+            if (allowEmpty) {
+                select.appendChild(new Option(allowEmpty, ''));
+            }
+            select.appendChild(new Option(item.text, item.id, true, true));
+            menu.style.display = 'none';
+            input.value = '';
+            select.dispatchEvent(new CustomEvent('remote-select', { detail: item }));
+            select.dispatchEvent(new Event('change'));
+        }
+
+        function render(data, append) {
+            if (!append) {
+                menu.innerHTML = '';
+            }
+            const more = menu.querySelector('.remote-select-more');
+            if (more) {
+                more.remove();
+            }
+            data.results.forEach(item => {
+                const button = document.createElement('button');
+                button.type = 'button';
+                button.className = 'list-group-item list-group-item-action py-1 small';
+                button.textContent = item.text;
+                if (item.status) {
+                    const badge = document.createElement('span');
+                    badge.className = 'badge bg-light text-dark ms-2';
+                    badge.textContent = item.status;
+                    button.appendChild(badge);
+                }
+                button.addEventListener('click', () => choose(item));
+                menu.appendChild(button);
+            });
+            if (data.has_more) {
+                const button = document.createElement('button');
+                button.type = 'button';
+                button.className = 'list-group-item list-group-item-action py-1 small text-primary remote-select-more';
+                button.textContent = 'Ver más resultados...';
+                button.addEventListener('click', () => search(currentQuery, page + 1));
+                menu.appendChild(button);
+            }
+            if (!menu.children.length) {
+                const empty = document.createElement('div');
+                empty.className = 'list-group-item py-1 small text-muted';
+                empty.textContent = 'Sin resultados';
+                menu.appendChild(empty);
+            }
+            menu.style.display = 'block';
+        }
+
+        function search(query, nextPage) {
+            if (!query) {
+                menu.style.display = 'none';
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            currentQuery = query;
+            page = nextPage;
+            const qs = new URLSearchParams({ q: query, page: nextPage });
+            fetch(`${url}?${qs}${params ? '&' + params : ''}`, { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => render(data, nextPage > 1))
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Error:', error);
+                    }
+                });
+        }
+
+        input.addEventListener('input', debounce(() => search(input.value.trim(), 1), 250));
+        document.addEventListener('click', event => {
+            if (!wrapper.contains(event.target)) {
+                menu.style.display = 'none';
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-remote-url]').forEach(initRemoteSelect);
+    });
+})();
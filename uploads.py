@@ -0,0 +1,205 @@
+"""
+Almacenamiento de fotos por contenido.
+
+Cada archivo se guarda como <sha256>.<extensión>: el hash se calcula mientras
+se copia la subida, así que la misma foto subida dos veces (o por equipos
+distintos) se guarda una sola vez y cambiar el código de un equipo no renombra
+nada. Como el contenido de un nombre no cambia nunca, se sirve con caché de un
+año marcada como immutable y con el hash como ETag.
+
+Varios equipos pueden compartir un archivo: las referencias se cuentan en la
+tabla equipment y el archivo se borra solo cuando ninguna fila lo usa. Un
+archivo recién subido que aún no tiene fila (la transacción no terminó) se
+protege con un periodo de gracia; `flask uploads-gc` borra los huérfanos.
+
+Las páginas enlazan las fotos con URLs firmadas (HMAC con SECRET_KEY y una
+expiración): la firma se verifica sin consultar la base de datos ni abrir la
+sesión. La expiración se redondea a ventanas de IMAGE_URL_TTL segundos para
+que la URL de una foto no cambie en cada página y la caché del navegador siga
+sirviendo.
+"""
+import hashlib
+import hmac
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+
+from flask import current_app, send_from_directory, url_for
+from sqlalchemy import func
+
+import images
+from models import db, Equipment
+
+CHUNK_SIZE = 64 * 1024
+# Un archivo direccionado por contenido nunca cambia: caché de un año
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Segundos durante los que un archivo sin referencias no se borra (subida en curso)
+GC_GRACE = 600
+
+_CONTENT_NAME = re.compile(r'^([0-9a-f]{64})\.([a-z0-9]+)$')
+_EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+
+def content_digest(filename):
+    """Hash del archivo si su nombre es direccionado por contenido, si no None."""
+    match = _CONTENT_NAME.match(filename or '')
+    return match.group(1) if match else None
+
+
+def _extension(filename):
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+    return _EXTENSION_ALIASES.get(extension, extension)
+
+
+def _store_stream(stream, upload_folder, extension):
+    os.makedirs(upload_folder, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                output.write(chunk)
+        filename = f'{digest.hexdigest()}.{extension}'
+        path = os.path.join(upload_folder, filename)
+        if os.path.exists(path):
+            # Ya existe: se descarta la copia y se renueva el periodo de gracia
+            os.remove(tmp_path)
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+        return filename
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_upload(file, upload_folder):
+    """Guarda un FileStorage subido y devuelve el nombre direccionado por contenido."""
+    return _store_stream(file.stream, upload_folder, _extension(file.filename))
+
+
+def references(filename):
+    return db.session.query(func.count(Equipment.id)) \
+        .filter(Equipment.image_filename == filename).scalar()
+
+
+def _remove(upload_folder, filename):
+    path = os.path.join(upload_folder, filename)
+    if os.path.exists(path):
+        os.remove(path)
+    images.delete_variants(upload_folder, filename)
+
+
+def release_upload(upload_folder, filename):
+    """
+    Borra el archivo si ya ninguna fila lo referencia. Llamar después del commit
+    que quitó la referencia.
+    """
+    if not filename or references(filename):
+        return False
+    path = os.path.join(upload_folder, filename)
+    if content_digest(filename) and os.path.exists(path) and time.time() - os.path.getmtime(path) < GC_GRACE:
+        # Puede ser la misma foto subida ahora por otro equipo; la borrará uploads-gc
+        return False
+    _remove(upload_folder, filename)
+    return True
+
+
+def _signature(filename, variant, expires):
+    message = f'{variant or ""}:{filename}:{expires}'.encode()
+    key = current_app.config['SECRET_KEY'].encode()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()[:32]
+
+
+def signed_url(filename, variant=None):
+    """URL firmada de una foto (o de una variante) válida entre una y dos ventanas de IMAGE_URL_TTL."""
+    ttl = current_app.config['IMAGE_URL_TTL']
+    expires = (int(time.time()) // ttl + 2) * ttl
+    signature = _signature(filename, variant, expires)
+    if variant:
+        return url_for('image_variant', variant=variant, filename=filename, exp=expires, sig=signature)
+    return url_for('uploaded_file', filename=filename, exp=expires, sig=signature)
+
+
+def verify_signature(filename, variant, expires, signature):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(filename, variant, expires), signature or '')
+
+
+def send_upload(upload_folder, filename, variant_path=None, variant=None):
+    """Envía un archivo (o una de sus variantes) con caché larga si es direccionado por contenido."""
+    path = variant_path or os.path.join(upload_folder, filename)
+    directory, name = os.path.abspath(os.path.dirname(path)), os.path.basename(path)
+    digest = content_digest(filename)
+    if digest is None:
+        return send_from_directory(directory, name, mimetype='image/webp' if variant else None)
+    response = send_from_directory(directory, name, mimetype='image/webp' if variant else None,
+                                   etag=f'{digest}-{variant}' if variant else digest,
+                                   max_age=IMMUTABLE_MAX_AGE)
+    # Solo usuarios autenticados: cacheable en el navegador, no en proxies compartidos
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
+def migrate_legacy_uploads(upload_folder, batch_size=500):
+    """
+    Renombra las fotos con nombre antiguo (código_archivo) a su hash y
+    actualiza las filas. Devuelve (filas actualizadas, archivos borrados).
+    """
+    updated = removed = 0
+    last_id = 0
+    while True:
+        rows = (db.session.query(Equipment.id, Equipment.image_filename)
+                .filter(Equipment.id > last_id, Equipment.image_filename.isnot(None))
+                .order_by(Equipment.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            return updated, removed
+        last_id = rows[-1].id
+        legacy = []
+        for equipment_id, filename in rows:
+            if content_digest(filename):
+                continue
+            path = os.path.join(upload_folder, filename)
+            new_name = None
+            if os.path.exists(path):
+                with open(path, 'rb') as source:
+                    new_name = _store_stream(source, upload_folder, _extension(filename))
+            # Nueva versión y fecha: invalida el fragmento cacheado de la fila (ver
+            # fragments.py) y los formularios de edición abiertos (ver concurrency.py)
+            Equipment.query.filter_by(id=equipment_id).update(
+                {Equipment.image_filename: new_name, Equipment.updated_at: datetime.utcnow(),
+                 Equipment.version_id: Equipment.version_id + 1}, synchronize_session=False)
+            legacy.append(filename)
+            updated += 1
+        db.session.commit()
+        for filename in legacy:
+            if not references(filename):
+                _remove(upload_folder, filename)
+                removed += 1
+
+
+def collect_garbage(upload_folder, grace=GC_GRACE):
+    """Borra los archivos direccionados por contenido que ninguna fila referencia."""
+    referenced = {name for (name,) in db.session.query(Equipment.image_filename)
+                  .filter(Equipment.image_filename.isnot(None)).distinct()}
+    removed = 0
+    now = time.time()
+    for name in os.listdir(upload_folder):
+        path = os.path.join(upload_folder, name)
+        if content_digest(name) and name not in referenced and now - os.path.getmtime(path) >= grace:
+            _remove(upload_folder, name)
+            removed += 1
+    return removed
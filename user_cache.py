@@ -0,0 +1,72 @@
+"""
+Caché del usuario autenticado para Flask-Login.
+
+load_user() se ejecuta en cada petición; en lugar de leer la fila completa de
+user cada vez, se guarda por proceso una copia ligera (id, usuario y email)
+durante USER_CACHE_TTL segundos. La copia se descarta al cerrar sesión y
+cuando una transacción que modificó o borró ese usuario hace commit en este
+proceso; el TTL acota cuánto tarda otro worker en ver el cambio.
+"""
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import LocalCache
+from models import db, User
+
+_users = LocalCache()
+_ttl = 60
+
+
+class UserSnapshot(UserMixin):
+    """Datos del usuario que usan las vistas y plantillas (current_user)."""
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+
+def init_app(app):
+    global _users, _ttl
+    _users = LocalCache(app.config.get('USER_CACHE_MAX_ENTRIES', 1024))
+    _ttl = app.config.get('USER_CACHE_TTL', 60)
+
+
+def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    snapshot = _users.get(user_id)
+    if snapshot is None:
+        row = db.session.query(User.id, User.username, User.email).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(row.id, row.username, row.email)
+        _users.set(user_id, snapshot, _ttl)
+    return snapshot
+
+
+def invalidate(user_id):
+    _users.delete(int(user_id))
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _collect_changed_user(mapper, connection, target):
+    # Cambio de contraseña, email o usuario: se invalida al hacer commit
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_users(session):
+    session.info.pop('changed_users', None)